@@ -0,0 +1,190 @@
+import asyncio
+import concurrent.futures
+import contextvars
+import functools
+import os
+import threading
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import NullPool
+from werkzeug.local import ContextVar
+
+from models import db, Venue, VenueGenre, Artist, ArtistGenre, Show, PAST_SHOWS_LIMIT, page_data
+
+'''
+    Parallel page queries (ASYNC_VIEWS=1). The venue and artist pages run
+    their independent queries (the row, its genres, counts and shows) at the
+    same time, each on its own AsyncSession over asyncpg, or aiosqlite, so a
+    page waits for its slowest query instead of the sum. The statements are
+    the ones the sync model methods execute.
+
+    The views stay sync: the request thread hands the queries to one long
+    lived event loop per worker process, which keeps the async pool (asyncpg
+    connections cannot move between loops), waits for the data and renders
+    the template itself. It is held for the whole page as in the sync views,
+    only for less time.
+'''
+
+ASYNC_DRIVERS = {'postgresql': 'postgresql+asyncpg', 'sqlite': 'sqlite+aiosqlite'}
+
+
+def async_url(url):
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()])
+
+
+def async_engine_options(config, url):
+    # engine_options for the async drivers
+    if url.get_backend_name() == 'sqlite':
+        return {}
+    if config['DB_EXTERNAL_POOL']:
+        # pgbouncer in transaction mode does not keep asyncpg's prepared statements
+        return {'poolclass': NullPool, 'connect_args': {'statement_cache_size': 0}}
+    options = {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+    }
+    if config['DB_STATEMENT_TIMEOUT']:
+        options['connect_args'] = {'server_settings': {'statement_timeout': str(config['DB_STATEMENT_TIMEOUT'])}}
+    return options
+
+
+def copy_result(future, task):
+    if task.cancelled():
+        future.cancel()
+    elif task.exception() is not None:
+        future.set_exception(task.exception())
+    else:
+        future.set_result(task.result())
+
+
+class EventLoop:
+    '''
+        An event loop running in a daemon thread, started on first use. The
+        request thread hands a coroutine over and waits for its result.
+    '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.loop = None
+
+    def get_loop(self):
+        with self.lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                threading.Thread(target=self.loop.run_forever, name='async-views', daemon=True).start()
+            return self.loop
+
+    def after_fork(self):
+        # the loop thread is not copied into a forked worker
+        self.lock = threading.Lock()
+        self.loop = None
+
+    def run(self, coroutine):
+        loop = self.get_loop()
+        future = concurrent.futures.Future()
+
+        def start():
+            task = loop.create_task(coroutine)
+            task.add_done_callback(functools.partial(copy_result, future))
+
+        # the task runs in a copy of the request's context, so request, g and current_app work in the coroutine
+        loop.call_soon_threadsafe(start, context=contextvars.copy_context())
+        return future.result()
+
+
+class AsyncDatabase:
+
+    # the primary database, where the sync detail pages read too
+
+    def __init__(self):
+        self.app = None
+        self.engine = None
+
+    def init_app(self, app):
+        self.app = app
+        self.engine = None
+
+    def get_engine(self):
+        # only called on the loop thread, the pooled connections belong to its loop
+        if self.engine is None:
+            config = self.app.config
+            url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+            self.engine = create_async_engine(async_url(url), **async_engine_options(config, url))
+        return self.engine
+
+    def after_fork(self):
+        # the inherited connections belong to the parent's loop, leave them open for it
+        if self.engine is not None:
+            self.engine.sync_engine.dispose(close=False)
+        self.engine = None
+
+    async def execute(self, statement):
+        # a session per statement, a session cannot run statements concurrently
+        async with AsyncSession(self.get_engine()) as session:
+            return await session.execute(statement)
+
+
+loop = EventLoop()
+database = AsyncDatabase()
+
+
+def run(coroutine):
+    # from a view: the coroutine's result, computed on the worker's loop
+    return loop.run(coroutine)
+
+
+'''
+    Model queries
+'''
+
+
+async def get_page(model, select_genres, column, select_shows, entity_id):
+    # Venue.get_page and Artist.get_page with the queries running concurrently
+    entity, genres, counts, shows_modified, upcoming_shows, past_shows = await asyncio.gather(
+        database.execute(db.select(model).filter(model.id == entity_id)),
+        database.execute(select_genres),
+        database.execute(Show.select_count_shows(column, entity_id)),
+        database.execute(Show.select_last_modified(column, entity_id)),
+        database.execute(select_shows(entity_id, upcoming=True)),
+        database.execute(select_shows(entity_id, upcoming=False, limit=PAST_SHOWS_LIMIT)))
+    entity = entity.scalar()
+    if entity is None:
+        return None
+    return page_data(entity, genres.scalars(), counts.one(), max(filter(None, shows_modified.one()), default=None),
+                     upcoming_shows.all(), past_shows.all())
+
+
+async def get_venue_page(venue_id):
+    return await get_page(Venue, db.select(VenueGenre.genre).filter(VenueGenre.venue_id == venue_id),
+                          Show.venue_id, Show.select_show_by_venue_id, venue_id)
+
+
+async def get_artist_page(artist_id):
+    return await get_page(Artist, db.select(ArtistGenre.genre).filter(ArtistGenre.artist_id == artist_id),
+                          Show.artist_id, Show.select_show_by_artist_id, artist_id)
+
+
+def after_fork():
+    loop.after_fork()
+    database.after_fork()
+
+
+def setup_async(app, views):
+    '''
+        Serve the endpoints in views, a dict of endpoint to a view function
+        running its queries with run(), with those views when ASYNC_VIEWS is
+        set.
+    '''
+    if not app.config['ASYNC_VIEWS']:
+        return
+    if ContextVar.__module__ == 'werkzeug.local':
+        raise RuntimeError('ASYNC_VIEWS needs contextvars, which this combination of Python and greenlet lacks')
+    database.init_app(app)
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=after_fork)
+    app.view_functions.update(views)
@@ -0,0 +1,136 @@
+import json
+from datetime import datetime
+from operator import itemgetter
+
+from flask import Blueprint, Response, request, abort
+
+from forms import Genre
+from models import Venue, Artist, Show, get_genre_page, page_args, search_results
+from cache import cache, make_key
+
+'''
+    JSON API, version 1. Listings come from the same column-projected model
+    queries as the pages, and detail payloads from the same cached page data.
+'''
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+
+def encode(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Genre):
+        return value.value
+    raise TypeError('{!r} is not JSON serializable'.format(value))
+
+
+def serializer(*fields, nested=None):
+    '''
+        Build a function turning a row (or a dict) into a dict of fields. The
+        getters are built once here instead of on every row; nested maps a
+        field to the serializer of its items.
+    '''
+    nested = nested or {}
+    getter = itemgetter(*fields)
+
+    def serialize(row):
+        values = getter(row if isinstance(row, dict) else row._mapping)
+        if len(fields) == 1:
+            values = (values,)
+        data = dict(zip(fields, values))
+        for field, serialize_item in nested.items():
+            data[field] = [serialize_item(item) for item in data[field]]
+        return data
+    return serialize
+
+
+serialize_venue_item = serializer('id', 'name', 'city', 'state', 'num_upcoming_shows')
+serialize_artist_item = serializer('id', 'name')
+serialize_show = serializer('id', 'venue_id', 'venue_name', 'artist_id', 'artist_name', 'artist_image_link',
+                            'start_time')
+serialize_venue_show = serializer('id', 'artist_id', 'artist_name', 'artist_image_link', 'start_time')
+serialize_artist_show = serializer('id', 'venue_id', 'venue_name', 'venue_image_link', 'start_time')
+serialize_venue = serializer(
+    'id', 'name', 'genres', 'address', 'city', 'state', 'phone', 'website_link', 'facebook_link', 'image_link',
+    'seeking_talent', 'seeking_description', 'upcoming_shows', 'past_shows', 'upcoming_shows_count',
+    'past_shows_count', nested={'upcoming_shows': serialize_venue_show, 'past_shows': serialize_venue_show})
+serialize_artist = serializer(
+    'id', 'name', 'genres', 'city', 'state', 'phone', 'website_link', 'facebook_link', 'image_link',
+    'seeking_venue', 'seeking_description', 'upcoming_shows', 'past_shows', 'upcoming_shows_count',
+    'past_shows_count', nested={'upcoming_shows': serialize_artist_show, 'past_shows': serialize_artist_show})
+serialize_search_item = serializer('id', 'name', 'num_upcoming_shows')
+
+
+def json_response(payload):
+    # compact separators, and a 304 when the client already holds this payload
+    response = Response(json.dumps(payload, default=encode, separators=(',', ':')),
+                        mimetype='application/json')
+    response.add_etag()
+    return response.make_conditional(request)
+
+
+def page_payload(page, serialize):
+    return {
+        'data': [serialize(row) for row in page.items],
+        'next': page.next_cursor,
+        'prev': page.prev_cursor
+    }
+
+
+@api.route('/venues')
+def venues():
+    paging, genres = page_args(request.args)
+    page = get_genre_page(Venue, paging, genres, lambda: Venue.get_venue_areas(**genres, **paging))
+    return json_response(page_payload(page, serialize_venue_item))
+
+
+@api.route('/venues/<int:venue_id>')
+def venue(venue_id):
+    data = cache.get_or_set(make_key('venue', venue_id), lambda: Venue.get_page(venue_id))
+    if data is None:
+        abort(404)
+    return json_response(serialize_venue(data))
+
+
+@api.route('/artists')
+def artists():
+    paging, genres = page_args(request.args)
+    page = get_genre_page(Artist, paging, genres, lambda: Artist.get_artists(**genres, **paging))
+    return json_response(page_payload(page, serialize_artist_item))
+
+
+@api.route('/artists/<int:artist_id>')
+def artist(artist_id):
+    data = cache.get_or_set(make_key('artist', artist_id), lambda: Artist.get_page(artist_id))
+    if data is None:
+        abort(404)
+    return json_response(serialize_artist(data))
+
+
+@api.route('/shows')
+def shows():
+    paging, _ = page_args(request.args)
+    return json_response(page_payload(Show.get_shows(**paging), serialize_show))
+
+
+@api.route('/search/<any(venues, artists, shows):entity>')
+def search(entity):
+    keyword = request.args.get('q', '')
+    if entity == 'shows':
+        rows, more = search_results(Show.search_show_by_keyword(keyword))
+        data = [serialize_show(row) for row in rows]
+    else:
+        if entity == 'venues':
+            rows, more = search_results(Venue.search_venue_by_keyword(keyword))
+        else:
+            rows, more = search_results(Artist.search_artist_by_keyword(keyword))
+        data = [serialize_search_item({'id': row.id, 'name': row.name, 'num_upcoming_shows': row.upcoming_shows_count})
+                for row in rows]
+    # results are cut at SEARCH_LIMIT, has_more tells there were others
+    return json_response({'count': len(data), 'has_more': more, 'data': data})
+
+
+@api.errorhandler(400)
+@api.errorhandler(404)
+def error(error):
+    return Response(json.dumps({'error': error.name}), status=error.code, mimetype='application/json')
@@ -3,16 +3,29 @@
 # ----------------------------------------------------------------------------#
 
 import json
-import dateutil.parser
-import babel
-from flask import Flask, render_template, request, Response, jsonify, flash, redirect, url_for
+import hashlib
+from datetime import timezone
+from itertools import groupby
+from operator import attrgetter
+from flask import Flask, render_template, request, Response, jsonify, flash, redirect, url_for, abort, \
+    stream_with_context, session, make_response
 from flask_moment import Moment
 
 from flask_migrate import Migrate
-import logging
-from logging import Formatter, FileHandler
 from forms import *
 from models import *
+from cache import cache, fragments, make_key, setup_cache
+from importer import import_data
+from exporter import export, export_data, FORMATS
+from api import api
+from metrics import registry, CONTENT_TYPE
+from sessions import setup_sessions
+from dates import format_datetime, format_datetimes
+from logs import setup_logging
+from instrumentation import setup_instrumentation
+from slow_queries import setup_slow_queries, slow_queries
+from counters import refresh_show_counts, check_show_counts
+import aio
 import os
 
 # ----------------------------------------------------------------------------#
@@ -25,10 +38,28 @@ moment = Moment(app)
 
 app.config.from_object('config')
 
+setup_sessions(app)
+
+setup_logging(app)
+
+setup_instrumentation(app)
+
+setup_slow_queries(app)
+
 setup_db(app)
 
+setup_cache(app)
+
 migrate = Migrate(app, db)
 
+app.cli.add_command(import_data)
+app.cli.add_command(export_data)
+app.cli.add_command(slow_queries)
+app.cli.add_command(refresh_show_counts)
+app.cli.add_command(check_show_counts)
+
+app.register_blueprint(api)
+
 
 
 
@@ -37,19 +68,52 @@ migrate = Migrate(app, db)
 # Filters.
 # ----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-    if isinstance(value, str):
-        date = dateutil.parser.parse(value)
-    else:
-        date = value
-    if format == 'full':
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format, locale='en')
-
-
 app.jinja_env.filters['datetime'] = format_datetime
+app.jinja_env.filters['datetimes'] = format_datetimes
+
+
+@app.template_global()
+def page_url(**cursor):
+    # current url with the cursor swapped, keeping page_size and any filters
+    args = request.args.to_dict(flat=False)
+    args.pop('after', None)
+    args.pop('before', None)
+    return url_for(request.endpoint, **request.view_args, **args, **cursor)
+
+
+def conditional_response(validators, last_modified, render):
+    '''
+        Answer 304 Not Modified without rendering when the client already holds
+        this version of the page, otherwise render it. Either way ETag,
+        Last-Modified and Cache-Control are set, so a browser, CDN or reverse
+        proxy can revalidate. Only the ETag is trusted for a 304: an HTTP date
+        has whole seconds and misses a second write within the same second.
+    '''
+    if request.cookies.get(app.session_cookie_name) and session.get('_flashes'):
+        # flashed messages are shown once, this response must not be reused
+        response = make_response(render())
+        response.cache_control.no_store = True
+        return response
+    etag = hashlib.sha1(repr((request.full_path,) + tuple(validators)).encode()).hexdigest()
+    if last_modified:
+        last_modified = last_modified.replace(tzinfo=timezone.utc, microsecond=0)
+    unmodified = request.if_none_match.contains(etag)
+    response = Response(status=304) if unmodified else make_response(render())
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.public = True
+    response.cache_control.max_age = app.config['HTTP_CACHE_MAX_AGE']
+    return response
+
+
+def table_validators(*models):
+    versions = get_table_versions(*models)
+    return versions, max(filter(None, versions[1::2]), default=None)
+
+
+def search_count(rows, more):
+    # results are cut at SEARCH_LIMIT, say so rather than report the limit as the count
+    return '{}+'.format(len(rows)) if more else len(rows)
 
 
 # ----------------------------------------------------------------------------#
@@ -66,36 +130,33 @@ def index():
 
 @app.route('/venues')
 def venues():
-    venues = Venue.get_venues()
-    shows = Show.get_all_upcomming_show_by_venues(venues)
-    states = list(set(map(lambda venue: (venue.state, venue.city), venues))) or []
-    data = []
-    for state, city in states:
-        city_venues = list(map(lambda venue: {
-            'id': venue.id,
-            'name': venue.name,
-            'num_upcoming_shows': len(list(filter(lambda show: show.venue_id == venue.id, shows)))},
-                               filter(lambda venue: venue.state == state, venues)))
-        data.append({
+    versions, last_modified = table_validators(Venue, Show)
+
+    def render():
+        paging, genres = page_args(request.args)
+        page = get_genre_page(Venue, paging, genres, lambda: Venue.get_venue_areas(**genres, **paging),
+                              version=versions[0])
+        # rows come sorted by (state, city), so areas can be grouped in a single pass
+        data = ({
             'city': city,
             'state': state,
-            'venues': city_venues,
-
-        })
-    return render_template('pages/venues.html', areas=data)
+            'venues': list(venues)
+        } for (state, city), venues in groupby(page.items, key=attrgetter('state', 'city')))
+        return render_template('pages/venues.html', areas=data, page=page)
+    return conditional_response(versions, last_modified, render)
 
 
 @app.route('/venues/search', methods=['POST'])
 def search_venues():
     keyword = request.form.get('search_term', '')
-    venues = Venue.search_venue_by_keyword(keyword)
+    venues, more = search_results(Venue.search_venue_by_keyword(keyword))
     response = {
-        'count': len(venues),
+        'count': search_count(venues, more),
         'data': list(map(
             lambda venue: {
                 'id': venue.id,
                 'name': venue.name,
-                'num_upcoming_shows': 0
+                'num_upcoming_shows': venue.upcoming_shows_count
             }, venues))
     }
     return render_template('pages/search_venues.html', results=response,
@@ -104,27 +165,15 @@ def search_venues():
 
 @app.route('/venues/<int:venue_id>')
 def show_venue(venue_id):
-    venue = Venue.get_venue(venue_id)
-    venue.genres = Venue.convert_genre_object_to_array(venue.genres)
-    column = ['show', 'artist_id', 'artist_name', 'artist_image_link', 'start_time']
-    rows = Show.get_show_by_venue_id(venue_id)
-    shows = []
-    if rows:
-        for row in rows:
-            shows.append(dict(zip(column, row)))
-        upcoming_shows = Show.get_upcomming_shows(shows)
-        past_shows = Show.get_past_shows(shows)
-        data = {
-            **dict(vars(venue)),
-            'upcoming_shows': upcoming_shows,
-            'past_shows': past_shows,
-            'upcoming_shows_count': len(upcoming_shows),
-            'past_shows_count': len(past_shows)
-        }
-    else:
-        data = dict(vars(venue))
-    data.update({'genres': Venue.convert_genre_name_to_label(data.get('genres'))})
-    return render_template('pages/show_venue.html', venue=data)
+    return render_venue(venue_id, cache.get_or_set(make_key('venue', venue_id), lambda: Venue.get_page(venue_id)))
+
+
+def render_venue(venue_id, data):
+    if data is None:
+        abort(404)
+    return conditional_response(
+        (venue_id, data['last_modified'], data['upcoming_shows_count'], data['past_shows_count']),
+        data['last_modified'], lambda: render_template('pages/show_venue.html', venue=data))
 
 
 #  Create Venue
@@ -144,7 +193,6 @@ def create_venue_submission():
     try:
         form_data = request.form.to_dict(flat=False)
         venue_dict = {key: form_data[key][0] if len(form_data[key]) <= 1 else form_data[key] for key in form_data}
-        print(str(venue_dict))
         # convert string value to boolean
         if venue_dict.get('seeking_talent') == 'y':
             venue_dict.update({'seeking_talent': True})
@@ -159,8 +207,8 @@ def create_venue_submission():
         venue.insert()
         #on successful db insert, flash success
         flash('Venue ' + venue.name + ' was successfully listed!')
-    except Exception as e:
-        print(e)
+    except Exception:
+        app.logger.exception('venue could not be created')
         flash('An error occurred. Venue with name ' + request.form.get('name') + ' could not be saved.')
         # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
     finally:
@@ -189,20 +237,26 @@ def delete_venue(venue_id):
 #  ----------------------------------------------------------------
 @app.route('/artists')
 def artists():
-    data = Artist.get_artists()
-    return render_template('pages/artists.html', artists=data)
+    versions, last_modified = table_validators(Artist)
+
+    def render():
+        paging, genres = page_args(request.args)
+        page = get_genre_page(Artist, paging, genres, lambda: Artist.get_artists(**genres, **paging),
+                              version=versions[0])
+        return render_template('pages/artists.html', artists=page.items, page=page)
+    return conditional_response(versions, last_modified, render)
 
 
 @app.route('/artists/search', methods=['POST'])
 def search_artists():
     keyword = request.form.get('search_term', '')
-    artists = Artist.search_artist_by_keyword(keyword)
+    artists, more = search_results(Artist.search_artist_by_keyword(keyword))
     response = {
-        "count": len(artists),
+        "count": search_count(artists, more),
         "data": list(map(lambda artist: {
             'id': artist.id,
             'name': artist.name,
-            'num_upcoming_shows': 0}, artists))
+            'num_upcoming_shows': artist.upcoming_shows_count}, artists))
     }
     return render_template('pages/search_artists.html', results=response,
                            search_term=request.form.get('search_term', ''))
@@ -210,27 +264,15 @@ def search_artists():
 
 @app.route('/artists/<int:artist_id>')
 def show_artist(artist_id):
-    artist = Artist.get_artist(artist_id)
-    artist.genres = Artist.convert_genre_object_to_array(artist.genres)
-    column = ['show', 'venue_id', 'venue_name', 'venue_image_link', 'start_time']
-    rows = Show.get_show_by_artist_id(artist_id)
-    shows = []
-    if rows:
-        for row in rows:
-            shows.append(dict(zip(column, row)))
-        upcoming_shows = Show.get_upcomming_shows(shows)
-        past_shows = Show.get_past_shows(shows)
-        data = {
-            **dict(vars(artist)),
-            'upcoming_shows': upcoming_shows,
-            'past_shows': past_shows,
-            'upcoming_shows_count': len(upcoming_shows),
-            'past_shows_count': len(past_shows)
-        }
-    else:
-        data = dict(vars(artist))
-    data.update({'genres': Artist.convert_genre_name_to_label(data.get('genres'))})
-    return render_template('pages/show_artist.html', artist=data)
+    return render_artist(artist_id, cache.get_or_set(make_key('artist', artist_id), lambda: Artist.get_page(artist_id)))
+
+
+def render_artist(artist_id, data):
+    if data is None:
+        abort(404)
+    return conditional_response(
+        (artist_id, data['last_modified'], data['upcoming_shows_count'], data['past_shows_count']),
+        data['last_modified'], lambda: render_template('pages/show_artist.html', artist=data))
 
 
 #  Update
@@ -240,7 +282,7 @@ def edit_artist(artist_id):
     form = ArtistForm()
     artist = Artist.get_artist(artist_id)
     form.process(obj=artist)
-    form.genres.data = Artist.convert_genre_name_to_label(Artist.convert_genre_object_to_array(artist.genres))
+    form.genres.data = list(artist.genres)
     return render_template('forms/edit_artist.html', form=form, artist=artist)
 
 
@@ -273,7 +315,7 @@ def edit_venue(venue_id):
     form = VenueForm()
     venue = Venue.get_venue(venue_id)
     form.process(obj=venue)
-    form.genres.data = Venue.convert_genre_name_to_label(Venue.convert_genre_object_to_array(venue.genres))
+    form.genres.data = list(venue.genres)
     return render_template('forms/edit_venue.html', form=form, venue=venue)
 
 
@@ -346,12 +388,12 @@ def create_artist_submission():
 @app.route('/shows')
 def shows():
     # displays list of shows at /shows
-    colmuns = ['show', 'venue_id', 'venue_name', 'artist_id', 'artist_name', 'artist_image_link', 'start_time']
-    rows = Show.get_shows()
-    data = []
-    for row in rows:
-        data.append(dict(zip(colmuns, row)))
-    return render_template('pages/shows.html', shows=data)
+    def render():
+        paging, _ = page_args(request.args)
+        page = Show.get_shows(**paging)
+        data = [row._asdict() for row in page.items]
+        return render_template('pages/shows.html', shows=data, page=page)
+    return conditional_response(*table_validators(Show, Venue, Artist), render)
 
 
 @app.route('/shows/create')
@@ -367,14 +409,13 @@ def create_show_submission():
     if not form.validate_on_submit():
         return render_template('forms/new_show.html', form=form)
     try:
-        form_data = request.form.to_dict(flat=True)
-        show_dict = {key: form_data[key][0] if len(form_data[key]) <= 1 else form_data[key] for key in form_data}
-        show = Show(**show_dict)
+        # the form has parsed start_time already, the raw string is only accepted by postgres
+        show = Show(artist_id=form.artist_id.data, venue_id=form.venue_id.data, start_time=form.start_time.data)
         show.insert()
         # on successful db insert, flash success
         flash('Show was successfully listed!')
-    except Exception as e:
-        print(e)
+    except Exception:
+        app.logger.exception('show could not be created')
         flash('An error occurred. Show could not be listed.')
     finally:
         db.session.close()
@@ -384,23 +425,57 @@ def create_show_submission():
 @app.route('/shows/search', methods=['POST'])
 def search_shows():
     keyword = request.form.get('search_term', '')
-    shows = Show.search_show_by_keyword(keyword)
+    shows, more = search_results(Show.search_show_by_keyword(keyword))
     response = {
-        "count": len(shows),
+        "count": search_count(shows, more),
         "data": list(map(lambda show: {
-            'id': show.id,
-            'venue_id': show.venue_id,
-            'venue_name': Venue.get_venue(show.venue_id).name,
-            'artist_id': show.artist_id,
-            'artist_name': Artist.get_artist(show.artist_id).name,
-            'artist_image_link': Artist.get_artist(show.artist_id).image_link,
-            'start_time': show.start_time,
+            **show._asdict(),
             'num_upcoming_shows': 0}, shows))
     }
     return render_template('pages/search_shows.html', results=response,
                            search_term=request.form.get('search_term', ''))
 
 
+#  Export
+#  ----------------------------------------------------------------
+
+@app.route('/export/<any(venues, artists, shows):entity>.<any(jsonl, csv):format>')
+def export_entity(entity, format):
+    return Response(stream_with_context(export(entity, format)), mimetype=FORMATS[format],
+                    headers={'Content-Disposition': 'attachment; filename={}.{}'.format(entity, format)})
+
+
+@app.route('/cache/stats')
+def cache_stats():
+    return jsonify(dict(cache.stats(), fragments=fragments.stats()))
+
+
+@app.route('/metrics')
+def metrics():
+    return Response(registry.render(), mimetype=CONTENT_TYPE)
+
+
+#  Parallel page queries
+#  ----------------------------------------------------------------
+#  The venue and artist pages with their queries run in parallel on the
+#  event loop of aio, they replace the views above when ASYNC_VIEWS is set.
+#  The request thread waits for the data, then renders the template
+
+def show_venue_async(venue_id):
+    return render_venue(venue_id, aio.run(cache.get_or_set_async(make_key('venue', venue_id),
+                                                                 lambda: aio.get_venue_page(venue_id))))
+
+
+def show_artist_async(artist_id):
+    return render_artist(artist_id, aio.run(cache.get_or_set_async(make_key('artist', artist_id),
+                                                                   lambda: aio.get_artist_page(artist_id))))
+
+aio.setup_async(app, {
+    'show_venue': show_venue_async,
+    'show_artist': show_artist_async,
+})
+
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
@@ -411,16 +486,6 @@ def server_error(error):
     return render_template('errors/500.html'), 500
 
 
-if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
-
 # ----------------------------------------------------------------------------#
 # Launch.
 # ----------------------------------------------------------------------------#
@@ -0,0 +1,59 @@
+'''
+    Payload size and latency of the JSON API against the HTML pages.
+
+    python -m benchmarks.api_vs_html
+'''
+import argparse
+import statistics
+import time
+
+from app import app
+from models import db
+from cache import setup_cache
+from benchmarks.data import seed
+
+PAIRS = [
+    ('/venues', '/api/v1/venues'),
+    ('/artists', '/api/v1/artists'),
+    ('/shows', '/api/v1/shows'),
+    ('/venues/1', '/api/v1/venues/1'),
+    ('/artists/1', '/api/v1/artists/1'),
+]
+
+
+def measure(client, url, requests):
+    timings = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = client.get(url)
+        timings.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200, (url, response.status_code)
+    return len(response.data), statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', default='sqlite://')
+    parser.add_argument('--venues', type=int, default=1000)
+    parser.add_argument('--artists', type=int, default=2000)
+    parser.add_argument('--shows', type=int, default=20000)
+    parser.add_argument('--requests', type=int, default=50)
+    args = parser.parse_args()
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = args.database_url
+    app.config['CACHE_TYPE'] = 'null'
+    setup_cache(app)
+    with app.app_context():
+        db.drop_all()
+        seed(venues=args.venues, artists=args.artists, shows=args.shows)
+
+    client = app.test_client()
+    print('{:<12} {:>12} {:>12} {:>12} {:>12}'.format('', 'html bytes', 'json bytes', 'html ms', 'json ms'))
+    for html_url, api_url in PAIRS:
+        html_size, html_ms = measure(client, html_url, args.requests)
+        api_size, api_ms = measure(client, api_url, args.requests)
+        print('{:<12} {:>12} {:>12} {:>12.2f} {:>12.2f}'.format(html_url, html_size, api_size, html_ms, api_ms))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+'''
+    Sync views against parallel page queries (ASYNC_VIEWS) on the venue and
+    artist pages: for each worker count, that many threads (as in a gunicorn
+    gthread worker) send requests for a while and the throughput and p50/p99
+    latency of each mode are reported.
+
+    python -m benchmarks.async_vs_sync --database-url postgresql://...
+
+    Both the sync and the async engine must reach the catalog, so it takes a
+    Postgres database (an in-memory sqlite database is private to its engine).
+    The catalog is seeded into it, replacing the tables.
+'''
+import argparse
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+
+# the ASYNC_VIEWS views are installed at import, the sync ones stay reachable through the app module
+os.environ['ASYNC_VIEWS'] = '1'
+os.environ.setdefault('LOG_FILE', os.devnull)
+
+def database_url(argv):
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--database-url', default=os.environ.get('DATABASE_URL'))
+    return parser.parse_known_args(argv)[0].database_url
+
+
+# the engine options are derived from the URL when the app is imported
+if database_url(sys.argv[1:]):
+    os.environ['DATABASE_URL'] = database_url(sys.argv[1:])
+
+import app as views
+from app import app
+from models import db
+from cache import setup_cache
+from benchmarks.data import seed
+
+SYNC_VIEWS = {endpoint: getattr(views, endpoint) for endpoint in
+              ('show_venue', 'show_artist')}
+ASYNC_VIEWS = {endpoint: app.view_functions[endpoint] for endpoint in SYNC_VIEWS}
+
+
+def cases(venues, artists):
+    # (name, method, url, form data), urls are drawn for every request
+    return [
+        ('venue', 'GET', lambda rng: '/venues/{}'.format(rng.randint(1, venues)), None),
+        ('artist', 'GET', lambda rng: '/artists/{}'.format(rng.randint(1, artists)), None),
+    ]
+
+
+def run(case, workers, duration):
+    name, method, url, data = case
+    timings = [[] for _ in range(workers)]
+    deadline = time.perf_counter() + duration
+
+    def work(index):
+        client = app.test_client(use_cookies=False)
+        rng = random.Random(index)
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            response = client.open(url(rng), method=method, data=data)
+            response.get_data()
+            assert response.status_code == 200, (name, response.status_code)
+            timings[index].append((time.perf_counter() - start) * 1000)
+
+    threads = [threading.Thread(target=work, args=(index,)) for index in range(workers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    timings = sorted(timing for worker in timings for timing in worker)
+    return {
+        'rps': len(timings) / elapsed,
+        'p50_ms': statistics.median(timings),
+        'p99_ms': timings[min(len(timings) - 1, int(len(timings) * 0.99))],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', default=app.config['SQLALCHEMY_DATABASE_URI'],
+                        help='read before the app is imported')
+    parser.add_argument('--venues', type=int, default=1000)
+    parser.add_argument('--artists', type=int, default=2000)
+    parser.add_argument('--shows', type=int, default=20000)
+    parser.add_argument('--workers', default='1,4,16', help='comma separated worker counts')
+    parser.add_argument('--duration', type=float, default=5.0, help='seconds per route, mode and worker count')
+    args = parser.parse_args()
+
+    app.config['CACHE_TYPE'] = 'null'
+    app.config['WTF_CSRF_ENABLED'] = False
+    setup_cache(app)
+    with app.app_context():
+        db.drop_all()
+        seed(venues=args.venues, artists=args.artists, shows=args.shows)
+
+    print('{:<14} {:>7} {:>6} {:>9} {:>9} {:>9}'.format('', 'workers', 'mode', 'req/s', 'p50 ms', 'p99 ms'))
+    for case in cases(args.venues, args.artists):
+        for workers in [int(count) for count in args.workers.split(',')]:
+            for mode, mode_views in (('sync', SYNC_VIEWS), ('async', ASYNC_VIEWS)):
+                app.view_functions.update(mode_views)
+                # warm up the pools and the template cache
+                run(case, workers, min(args.duration, 0.5))
+                result = run(case, workers, args.duration)
+                print('{:<14} {:>7} {:>6} {rps:>9.1f} {p50_ms:>9.2f} {p99_ms:>9.2f}'.format(
+                    case[0], workers, mode, **result))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+'''
+    Deterministic synthetic catalog for benchmarks
+'''
+import random
+from datetime import datetime, timedelta
+
+from forms import Genre, State
+from models import db, Venue, VenueGenre, Artist, ArtistGenre, Show
+
+CITIES = {
+    'NY': ['New York', 'Brooklyn', 'Buffalo'],
+    'CA': ['San Francisco', 'Los Angeles', 'Oakland', 'San Diego'],
+    'IL': ['Chicago'],
+    'TX': ['Austin', 'Houston', 'Dallas'],
+    'TN': ['Nashville', 'Memphis'],
+    'LA': ['New Orleans'],
+    'WA': ['Seattle'],
+}
+BATCH_SIZE = 5000
+
+
+def _area(rng):
+    # most of the catalog sits in a handful of big cities, the rest is spread thin
+    if rng.random() < 0.8:
+        state = rng.choice(list(CITIES))
+        return state, rng.choice(CITIES[state])
+    state = rng.choice(list(State)).value
+    return state, 'Town {}'.format(rng.randint(1, 200))
+
+
+def _genres(rng):
+    return rng.sample(list(Genre), rng.randint(1, 3))
+
+
+def _insert(table, rows):
+    for start in range(0, len(rows), BATCH_SIZE):
+        db.session.execute(table.insert(), rows[start:start + BATCH_SIZE])
+    db.session.commit()
+
+
+def seed(venues=1000, artists=2000, shows=20000, seed=0):
+    '''
+        Create the tables and fill them with a reproducible catalog: the same
+        arguments always produce the same rows. Shows span five years back and
+        one year ahead of now.
+    '''
+    rng = random.Random(seed)
+    db.create_all()
+    venue_rows, artist_rows, show_rows = [], [], []
+    venue_genre_rows, artist_genre_rows = [], []
+    for venue_id in range(1, venues + 1):
+        state, city = _area(rng)
+        venue_rows.append({
+            'id': venue_id, 'name': 'Venue {}'.format(venue_id), 'city': city, 'state': state,
+            'address': '{} Main St'.format(venue_id), 'phone': '555-555-{:04d}'.format(venue_id % 10000),
+            'seeking_talent': rng.random() < 0.3,
+        })
+        venue_genre_rows.extend({'venue_id': venue_id, 'genre': genre} for genre in _genres(rng))
+    for artist_id in range(1, artists + 1):
+        state, city = _area(rng)
+        artist_rows.append({
+            'id': artist_id, 'name': 'Artist {}'.format(artist_id), 'city': city, 'state': state,
+            'phone': '555-555-{:04d}'.format(artist_id % 10000),
+            'image_link': 'https://example.com/artists/{}.jpg'.format(artist_id),
+            'seeking_venue': rng.random() < 0.3,
+        })
+        artist_genre_rows.extend({'artist_id': artist_id, 'genre': genre} for genre in _genres(rng))
+    now = datetime.now().replace(minute=0, second=0, microsecond=0)
+    for show_id in range(1, shows + 1):
+        show_rows.append({
+            'id': show_id,
+            # popular venues and artists host most of the shows
+            'venue_id': min(int(rng.paretovariate(1.2)), venues),
+            'artist_id': rng.randint(1, artists),
+            'start_time': now + timedelta(hours=rng.randint(-5 * 365 * 24, 365 * 24)),
+        })
+    _insert(Venue.__table__, venue_rows)
+    _insert(Artist.__table__, artist_rows)
+    _insert(VenueGenre.__table__, venue_genre_rows)
+    _insert(ArtistGenre.__table__, artist_genre_rows)
+    _insert(Show.__table__, show_rows)
+    Venue.refresh_show_counts()
+    Artist.refresh_show_counts()
+    db.session.commit()
@@ -0,0 +1,65 @@
+'''
+    Per row cost of the datetime template filter: babel with the pattern
+    parsed on every call against the cached patterns, the memoized filter
+    and the column (batch) formatter.
+
+    python -m benchmarks.format_datetime
+'''
+import argparse
+import random
+import timeit
+from datetime import datetime, timedelta
+
+import babel.dates
+import dateutil.parser
+
+from dates import FORMATS, format_datetime, format_datetimes, get_locale, get_pattern, to_datetime
+
+
+def uncached(value, format='full'):
+    # the filter as it was: dateutil for strings, babel parsing the pattern and locale each call
+    if isinstance(value, str):
+        value = dateutil.parser.parse(value)
+    return babel.dates.format_datetime(value, FORMATS[format], locale='en')
+
+
+def cached_pattern(value, format='full'):
+    return get_pattern(format).apply(to_datetime(value), get_locale('en'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--distinct', type=int, default=300, help='distinct start times among the rows')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    start = datetime(2024, 1, 1, 20, 0)
+    times = [start + timedelta(hours=rng.randrange(24 * 365)) for _ in range(args.distinct)]
+    rows = [rng.choice(times) for _ in range(args.rows)]
+    strings = [str(value) for value in rows]
+    assert [uncached(value) for value in rows] == format_datetimes(rows, 'full')
+
+    def cold_filter():
+        format_datetime.cache_clear()
+        return [format_datetime(value, 'full') for value in rows]
+
+    runs = [
+        ('uncached, datetime', lambda: [uncached(value) for value in rows]),
+        ('uncached, string', lambda: [uncached(value) for value in strings]),
+        ('cached pattern', lambda: [cached_pattern(value) for value in rows]),
+        ('filter, cold', cold_filter),
+        ('filter, warm', lambda: [format_datetime(value, 'full') for value in rows]),
+        ('batch', lambda: format_datetimes(rows, 'full')),
+    ]
+    print('{} rows, {} distinct values'.format(args.rows, args.distinct))
+    print('{:<20} {:>10}'.format('', 'us/row'))
+    for name, run in runs:
+        run()
+        best = min(timeit.repeat(run, number=1, repeat=args.repeat))
+        print('{:<20} {:>10.2f}'.format(name, best / args.rows * 1e6))
+
+
+if __name__ == '__main__':
+    main()
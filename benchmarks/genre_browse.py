@@ -0,0 +1,55 @@
+'''
+    Latency of browsing artists and venues by genre: the first request loads
+    the page, the following ones are served from the page cache until the
+    table is written to.
+
+    python -m benchmarks.genre_browse --artists 100000
+'''
+import argparse
+import statistics
+import time
+
+from app import app
+from models import db
+from benchmarks.data import seed
+
+URLS = [
+    '/artists?genre=Jazz',
+    '/artists?genre=Jazz&genre=Blues',
+    '/artists?genre=Jazz&genre=Blues&match=all',
+    '/venues?genre=Jazz',
+    '/venues?genre=Jazz&genre=Blues&match=all',
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', default='sqlite://')
+    parser.add_argument('--venues', type=int, default=5000)
+    parser.add_argument('--artists', type=int, default=100000)
+    parser.add_argument('--shows', type=int, default=50000)
+    parser.add_argument('--requests', type=int, default=50)
+    args = parser.parse_args()
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = args.database_url
+    with app.app_context():
+        db.drop_all()
+        seed(venues=args.venues, artists=args.artists, shows=args.shows)
+
+    client = app.test_client()
+    print('{:<45} {:>10} {:>10} {:>10}'.format('url', 'first ms', 'p50 ms', 'max ms'))
+    for url in URLS:
+        start = time.perf_counter()
+        assert client.get(url).status_code == 200, url
+        first = (time.perf_counter() - start) * 1000
+        timings = []
+        for _ in range(args.requests):
+            start = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - start) * 1000)
+            assert response.status_code == 200, (url, response.status_code)
+        print('{:<45} {:>10.2f} {:>10.2f} {:>10.2f}'.format(url, first, statistics.median(timings), max(timings)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,254 @@
+'''
+    Route suite: drives every route of the app through the test client on a
+    synthetic catalog and records p50/p99 latency, SQL statements and peak
+    allocated memory per request, then compares them with a stored baseline.
+
+    python -m benchmarks.suite                    # exit status 1 on regressions
+    python -m benchmarks.suite --save-baseline    # record both baselines
+
+    Query counts do not depend on the machine: they are kept in
+    benchmarks/baseline.json, in git, and any increase is a regression.
+    Latencies and memory do, they are compared with
+    benchmarks/baseline.local.json, which the first run on a machine records
+    and git ignores. The p99 of a few dozen requests is about their maximum,
+    so it is only reported unless --p99-tolerance is given.
+'''
+import argparse
+import gc
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+# keep the access log of a few thousand requests out of error.log
+os.environ.setdefault('LOG_FILE', os.devnull)
+
+
+def database_url(argv):
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--database-url', default='sqlite://')
+    return parser.parse_known_args(argv)[0].database_url
+
+
+# the engine options are derived from the URL when the app is imported
+os.environ['DATABASE_URL'] = database_url(sys.argv[1:])
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app import app
+from models import db
+from cache import setup_cache
+from benchmarks.data import seed
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+LOCAL_BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.local.json')
+QUERY_KEYS = ('queries',)
+
+VENUE = {'name': 'Bench Venue', 'city': 'Austin', 'state': 'TX', 'address': '1 Main St', 'phone': '555-555-5555',
+         'genres': ['Jazz', 'Blues'], 'seeking_talent': 'y', 'seeking_description': 'Looking for bands'}
+ARTIST = {'name': 'Bench Artist', 'city': 'Austin', 'state': 'TX', 'phone': '555-555-5555',
+          'genres': ['Jazz', 'Blues'], 'seeking_venue': 'y', 'seeking_description': 'Looking for venues'}
+
+
+def cases(venues):
+    # (name, endpoint, method, url, form data), url may take the iteration's spare venue id
+    spare_venues = iter(range(venues, 0, -1))
+    return [
+        ('index', 'index', 'GET', '/', None),
+        ('venues', 'venues', 'GET', '/venues', None),
+        ('venues by genre', 'venues', 'GET', '/venues?genre=Jazz&genre=Blues', None),
+        ('venue', 'show_venue', 'GET', '/venues/1', None),
+        ('venue search', 'search_venues', 'POST', '/venues/search', {'search_term': 'the'}),
+        ('venue form', 'create_venue_form', 'GET', '/venues/create', None),
+        ('venue create', 'create_venue_submission', 'POST', '/venues/create', VENUE),
+        ('venue edit form', 'edit_venue', 'GET', '/venues/2/edit', None),
+        ('venue edit', 'edit_venue_submission', 'POST', '/venues/2/edit', VENUE),
+        ('venue delete', 'delete_venue', 'DELETE', lambda: '/venues/{}'.format(next(spare_venues)), None),
+        ('artists', 'artists', 'GET', '/artists', None),
+        ('artist', 'show_artist', 'GET', '/artists/1', None),
+        ('artist search', 'search_artists', 'POST', '/artists/search', {'search_term': 'the'}),
+        ('artist form', 'create_artist_form', 'GET', '/artists/create', None),
+        ('artist create', 'create_artist_submission', 'POST', '/artists/create', ARTIST),
+        ('artist edit form', 'edit_artist', 'GET', '/artists/2/edit', None),
+        ('artist edit', 'edit_artist_submission', 'POST', '/artists/2/edit', ARTIST),
+        ('shows', 'shows', 'GET', '/shows', None),
+        ('show search', 'search_shows', 'POST', '/shows/search', {'search_term': 'the'}),
+        ('show form', 'create_shows', 'GET', '/shows/create', None),
+        ('show create', 'create_show_submission', 'POST', '/shows/create',
+         {'artist_id': '3', 'venue_id': '3', 'start_time': '2030-01-01 20:00:00'}),
+        ('export venues', 'export_entity', 'GET', '/export/venues.jsonl', None),
+        ('export shows', 'export_entity', 'GET', '/export/shows.csv', None),
+        ('api venues', 'api.venues', 'GET', '/api/v1/venues', None),
+        ('api venue', 'api.venue', 'GET', '/api/v1/venues/1', None),
+        ('api artists', 'api.artists', 'GET', '/api/v1/artists', None),
+        ('api artist', 'api.artist', 'GET', '/api/v1/artists/1', None),
+        ('api shows', 'api.shows', 'GET', '/api/v1/shows', None),
+        ('api search', 'api.search', 'GET', '/api/v1/search/venues?q=the', None),
+        ('cache stats', 'cache_stats', 'GET', '/cache/stats', None),
+        ('metrics', 'metrics', 'GET', '/metrics', None),
+    ]
+
+
+class QueryCounter:
+
+    def __init__(self):
+        self.count = 0
+        event.listen(Engine, 'after_cursor_execute', self.after_cursor_execute)
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+
+def request(client, method, url, data):
+    response = client.open(url() if callable(url) else url, method=method, data=data)
+    # consume streamed bodies so their queries are part of the request
+    response.get_data()
+    assert response.status_code < 400, (method, url, response.status_code)
+    return response
+
+
+def run_case(client, counter, case, requests, memory_requests):
+    name, endpoint, method, url, data = case
+    request(client, method, url, data)
+
+    timings = []
+    gc.collect()
+    counter.count = 0
+    for _ in range(requests):
+        start = time.perf_counter()
+        request(client, method, url, data)
+        timings.append((time.perf_counter() - start) * 1000)
+    queries = counter.count / requests
+
+    peak = 0
+    tracemalloc.start()
+    try:
+        for _ in range(memory_requests):
+            tracemalloc.reset_peak()
+            request(client, method, url, data)
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+    finally:
+        tracemalloc.stop()
+
+    timings.sort()
+    return {
+        'p50_ms': round(statistics.median(timings), 3),
+        'p99_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.99))], 3),
+        'queries': round(queries, 2),
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+
+def missing_routes(suite):
+    covered = {case[1] for case in suite}
+    return sorted(rule.endpoint for rule in app.url_map.iter_rules()
+                  if rule.endpoint != 'static' and rule.endpoint not in covered)
+
+
+def regressions(result, baseline, args):
+    # baseline holds the values of the route found in either baseline file
+    found = []
+    if 'queries' in baseline and result['queries'] > baseline['queries']:
+        found.append('queries {} -> {}'.format(baseline['queries'], result['queries']))
+    checks = [('p50_ms', args.latency_tolerance, args.min_latency_delta),
+              ('peak_kib', args.memory_tolerance, args.min_memory_delta)]
+    if args.p99_tolerance is not None:
+        checks.append(('p99_ms', args.p99_tolerance, args.min_p99_delta))
+    for key, tolerance, min_delta in checks:
+        if key in baseline and result[key] > baseline[key] * (1 + tolerance) \
+                and result[key] - baseline[key] > min_delta:
+            found.append('{} {} -> {}'.format(key, baseline[key], result[key]))
+    return found
+
+
+def load_baseline(path, settings):
+    if not os.path.exists(path):
+        return None
+    with open(path) as file:
+        baseline = json.load(file)
+    if baseline['settings'] != settings:
+        sys.exit('{} was recorded with {}, run with the same settings or --save-baseline'.format(
+            path, baseline['settings']))
+    return baseline['results']
+
+
+def save_baseline(path, settings, results):
+    with open(path, 'w') as file:
+        json.dump({'settings': settings, 'results': results}, file, indent=2, sort_keys=True)
+        file.write('\n')
+    print('baseline written to {}'.format(path))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', default='sqlite://', help='read before the app is imported')
+    parser.add_argument('--venues', type=int, default=1000)
+    parser.add_argument('--artists', type=int, default=2000)
+    parser.add_argument('--shows', type=int, default=20000)
+    parser.add_argument('--requests', type=int, default=30, help='timed requests per route')
+    parser.add_argument('--memory-requests', type=int, default=3, help='requests per route under tracemalloc')
+    parser.add_argument('--baseline', default=BASELINE, help='query counts, kept in git')
+    parser.add_argument('--local-baseline', default=LOCAL_BASELINE, help='latencies and memory of this machine')
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--latency-tolerance', type=float, default=0.3, help='allowed p50 slowdown')
+    parser.add_argument('--p99-tolerance', type=float, help='allowed p99 slowdown, p99 is only reported without it')
+    parser.add_argument('--min-latency-delta', type=float, default=1.0, help='ms, smaller slowdowns are ignored')
+    parser.add_argument('--min-p99-delta', type=float, default=20.0, help='ms, smaller p99 slowdowns are ignored')
+    parser.add_argument('--memory-tolerance', type=float, default=0.25)
+    parser.add_argument('--min-memory-delta', type=float, default=64.0, help='KiB, smaller increases are ignored')
+    args = parser.parse_args()
+
+    app.config['CACHE_TYPE'] = 'null'
+    app.config['WTF_CSRF_ENABLED'] = False
+    setup_cache(app)
+    settings = {'database': args.database_url.split(':')[0], 'venues': args.venues, 'artists': args.artists,
+                'shows': args.shows, 'requests': args.requests}
+
+    suite = cases(args.venues)
+    missing = missing_routes(suite)
+    if missing:
+        sys.exit('routes without a benchmark case: {}'.format(', '.join(missing)))
+
+    baseline = local_baseline = None
+    if not args.save_baseline:
+        baseline = load_baseline(args.baseline, settings)
+        local_baseline = load_baseline(args.local_baseline, settings)
+
+    with app.app_context():
+        db.drop_all()
+        seed(venues=args.venues, artists=args.artists, shows=args.shows)
+
+    client = app.test_client()
+    counter = QueryCounter()
+    results = {}
+    failures = 0
+    print('{:<18} {:>9} {:>9} {:>8} {:>10}'.format('', 'p50 ms', 'p99 ms', 'queries', 'peak KiB'))
+    for case in suite:
+        result = results[case[0]] = run_case(client, counter, case, args.requests, args.memory_requests)
+        line = '{:<18} {p50_ms:>9.2f} {p99_ms:>9.2f} {queries:>8} {peak_kib:>10}'.format(case[0], **result)
+        route_baseline = dict((local_baseline or {}).get(case[0], {}), **(baseline or {}).get(case[0], {}))
+        if baseline is not None or local_baseline is not None:
+            if not route_baseline:
+                line += '  new'
+            else:
+                found = regressions(result, route_baseline, args)
+                failures += bool(found)
+                line += '  REGRESSION: ' + ', '.join(found) if found else ''
+        print(line)
+
+    if args.save_baseline or baseline is None:
+        save_baseline(args.baseline, settings,
+                      {name: {key: result[key] for key in QUERY_KEYS} for name, result in results.items()})
+    if args.save_baseline or local_baseline is None:
+        save_baseline(args.local_baseline, settings,
+                      {name: {key: value for key, value in result.items() if key not in QUERY_KEYS}
+                       for name, result in results.items()})
+    if failures:
+        sys.exit('{} route(s) regressed'.format(failures))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,261 @@
+import asyncio
+import hashlib
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+import click
+from jinja2 import nodes
+from jinja2.ext import Extension
+
+'''
+    Cache for page data that only changes when a model write commits.
+    Entries are invalidated from the model insert/update/delete methods
+    and also expire after CACHE_TTL seconds, since shows move from
+    upcoming to past as time goes by.
+'''
+
+
+def make_key(*parts):
+    return ':'.join(str(part) for part in parts)
+
+
+class LRUBackend:
+    # in-process, per worker
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisBackend:
+    # shared by every worker talking to the same redis, needs the redis package
+    def __init__(self, url, ttl=300, prefix='fyyur:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return pickle.loads(value) if value is not None else None
+
+    def set(self, key, value):
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=self.ttl)
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*[self.prefix + key for key in keys])
+
+    def clear(self):
+        keys = list(self.client.scan_iter(self.prefix + '*'))
+        if keys:
+            self.client.delete(*keys)
+
+    def __len__(self):
+        return sum(1 for _ in self.client.scan_iter(self.prefix + '*'))
+
+
+class NullBackend:
+    def get(self, key):
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def delete(self, *keys):
+        pass
+
+    def clear(self):
+        pass
+
+    def __len__(self):
+        return 0
+
+
+class Cache:
+    def __init__(self, backend=None):
+        self.backend = backend or LRUBackend()
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        cache_type = app.config.get('CACHE_TYPE', 'lru')
+        ttl = app.config.get('CACHE_TTL', 300)
+        if cache_type == 'redis':
+            self.backend = RedisBackend(app.config['CACHE_REDIS_URL'], ttl=ttl)
+        elif cache_type == 'null':
+            self.backend = NullBackend()
+        else:
+            self.backend = LRUBackend(maxsize=app.config.get('CACHE_MAXSIZE', 1024), ttl=ttl)
+
+    def get_or_set(self, key, create):
+        '''
+            Return the cached value for key, or build it with create() and
+            cache it. None is never cached, so missing rows are looked up again.
+        '''
+        value = self.backend.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+        value = create()
+        if value is not None:
+            self.backend.set(key, value)
+        return value
+
+    async def get_or_set_async(self, key, create):
+        # get_or_set on an event loop, create is a coroutine function. The lru answers from memory, the
+        # other backends block on the network and are called from the loop's executor
+        value = await self.call_async(self.backend.get, key)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+        value = await create()
+        if value is not None:
+            await self.call_async(self.backend.set, key, value)
+        return value
+
+    async def call_async(self, method, *args):
+        if self.is_local():
+            return method(*args)
+        return await asyncio.get_running_loop().run_in_executor(None, method, *args)
+
+    def delete(self, *keys):
+        self.backend.delete(*keys)
+
+    def is_local(self):
+        # entries only this process can invalidate
+        return isinstance(self.backend, LRUBackend)
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        return {
+            'backend': type(self.backend).__name__,
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self.backend)
+        }
+
+
+class FragmentCache:
+    '''
+        Rendered template fragments, in process. A fragment is keyed by its
+        place in the template, the entity it shows and the values it renders,
+        so a changed row renders a new fragment and the old one is left for
+        the LRU to evict; writes need not invalidate anything.
+    '''
+
+    def __init__(self, maxsize=4096, ttl=300):
+        self.entries = LRUBackend(maxsize=maxsize, ttl=ttl)
+        self.enabled = True
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        maxsize = app.config.get('FRAGMENT_CACHE_MAXSIZE', 4096)
+        # independent of CACHE_TYPE: the fragments need no invalidation, so a per worker cache is always correct
+        self.enabled = bool(maxsize)
+        self.entries = LRUBackend(maxsize=maxsize, ttl=app.config.get('CACHE_TTL', 300))
+
+    def get_or_render(self, location, parts, render):
+        if not self.enabled:
+            return render()
+        # the values may contain ':' or be None, joining them could make two fragments share a key
+        key = make_key('fragment', location, hashlib.sha1(repr(tuple(parts)).encode()).hexdigest())
+        value = self.entries.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+        value = render()
+        self.entries.set(key, value)
+        return value
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self.entries)}
+
+
+class FragmentCacheExtension(Extension):
+    '''
+        {% cache 'venue', venue.id, venue.name %} ... {% endcache %}
+
+        The first two values name the entity, the others are everything else
+        the block renders: a fragment is reused whenever they are all equal.
+    '''
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        parts = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            parts.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        location = nodes.Const('{}:{}'.format(parser.name, lineno))
+        call = self.call_method('_render', [location, nodes.List(parts)])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _render(self, location, parts, caller):
+        return self.environment.fragment_cache.get_or_render(location, parts, caller)
+
+
+cache = Cache()
+fragments = FragmentCache()
+
+
+def warn_local_cache():
+    # for commands writing from their own process, the web workers' lru caches are out of reach
+    if cache.is_local():
+        click.echo('CACHE_TYPE=lru: running workers may serve cached pages for up to CACHE_TTL seconds, '
+                   'use a shared cache (CACHE_TYPE=redis) to have them invalidated', err=True)
+
+
+def invalidate(*keys):
+    # called after a write commits, drops the page data of the entities
+    cache.delete(*keys)
+
+
+def setup_cache(app):
+    cache.init_app(app)
+    fragments.init_app(app)
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    app.jinja_env.extend(fragment_cache=fragments)
@@ -0,0 +1,66 @@
+from datetime import datetime
+
+import click
+from flask.cli import with_appcontext
+
+from models import db, Venue, Artist
+from cache import cache, fragments, invalidate, make_key, warn_local_cache
+
+'''
+    Maintenance of the upcoming/past show counters on venues and artists.
+    Show writes keep them current, but a show only moves from upcoming to
+    past when refresh-show-counts runs, so schedule it, e.g. every minute:
+
+        * * * * * cd /srv/fyyur && FLASK_APP=app flask refresh-show-counts
+'''
+
+MODELS = {'venue': Venue, 'artist': Artist}
+
+
+@click.command('refresh-show-counts')
+@click.option('--all', 'refresh_all', is_flag=True, help='Recount every row, not only those with a show that started.')
+@with_appcontext
+def refresh_show_counts(refresh_all):
+    '''Move started shows from the upcoming to the past counters.'''
+    for name, model in MODELS.items():
+        ids = None
+        if not refresh_all:
+            ids = [id for id, in db.session.query(model.id).filter(model.next_show_at <= datetime.now())]
+        updated = model.refresh_show_counts(ids)
+        db.session.commit()
+        if ids:
+            invalidate(*[make_key(name, id) for id in ids])
+        click.echo('{} {} counters refreshed'.format(updated, name))
+    if refresh_all:
+        cache.clear()
+        fragments.clear()
+    warn_local_cache()
+
+
+@click.command('check-show-counts')
+@click.option('--fix', is_flag=True, help='Recount the rows that are off.')
+@with_appcontext
+def check_show_counts(fix):
+    '''Compare the show counters with a recount of the shows.'''
+    failed = False
+    now = datetime.now()
+    for name, model in MODELS.items():
+        rows = model.check_show_counts()
+        for row in rows:
+            # a show of the row has started since the last refresh, the counters are expected to lag
+            due = row.next_show_at is not None and row.next_show_at <= now
+            failed = failed or not (due or fix)
+            click.echo('{} {}: upcoming {} (counted {}), past {} (counted {}){}'.format(
+                name, row.id, row.upcoming_shows_count, row.upcoming, row.past_shows_count, row.past,
+                ', refresh due' if due else ''))
+        if rows and fix:
+            model.refresh_show_counts([row.id for row in rows])
+            db.session.commit()
+            invalidate(*[make_key(name, row.id) for row in rows])
+            click.echo('{} {} counters fixed'.format(len(rows), name))
+        elif not rows:
+            click.echo('{} counters ok'.format(name))
+    if fix:
+        warn_local_cache()
+    if failed:
+        raise click.ClickException('show counters are out of date, run with --fix or refresh-show-counts')
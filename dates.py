@@ -0,0 +1,57 @@
+from functools import lru_cache
+
+import dateutil.parser
+from babel import Locale
+from babel.dates import UTC, parse_pattern
+
+'''
+    Date formatting for the templates. Patterns and locales are parsed once,
+    formatted values are memoized since the same show times are rendered on
+    every page view, and a whole column can be formatted in one call.
+'''
+
+FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+LOCALE = 'en'
+
+
+@lru_cache(maxsize=64)
+def get_pattern(format):
+    return parse_pattern(FORMATS.get(format, format))
+
+
+@lru_cache(maxsize=16)
+def get_locale(locale):
+    return Locale.parse(locale)
+
+
+@lru_cache(maxsize=1024)
+def parse_datetime(value):
+    return dateutil.parser.parse(value)
+
+
+def to_datetime(value):
+    if isinstance(value, str):
+        value = parse_datetime(value)
+    # babel renders naive datetimes as UTC
+    return value if value.tzinfo is not None else value.replace(tzinfo=UTC)
+
+
+@lru_cache(maxsize=4096)
+def format_datetime(value, format='medium', locale=LOCALE):
+    return get_pattern(format).apply(to_datetime(value), get_locale(locale))
+
+
+def format_datetimes(values, format='medium', locale=LOCALE):
+    # formats a column of values, the pattern and locale are looked up once and repeated values formatted once
+    pattern = get_pattern(format)
+    locale = get_locale(locale)
+    formatted = {}
+    result = []
+    for value in values:
+        if value not in formatted:
+            formatted[value] = pattern.apply(to_datetime(value), locale)
+        result.append(formatted[value])
+    return result
@@ -0,0 +1,108 @@
+import csv
+import io
+import json
+from itertools import islice
+
+import click
+from flask.cli import with_appcontext
+
+from models import db, Venue, VenueGenre, Artist, ArtistGenre, Show
+
+'''
+    Streaming export of the catalog. Rows are read through a server-side
+    cursor in chunks and encoded chunk by chunk, so memory stays flat no
+    matter how many rows are dumped.
+'''
+
+CHUNK_SIZE = 1000
+FORMATS = {
+    'jsonl': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def iter_chunks(query, chunk_size=CHUNK_SIZE):
+    rows = iter(query.yield_per(chunk_size))
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def with_genres(chunk, link_id_column, link_genre_column):
+    # one lookup per chunk, genres encoded with their labels as on the pages
+    ids = [row.id for row in chunk]
+    genres = {}
+    for id, genre in db.session.query(link_id_column, link_genre_column).filter(link_id_column.in_(ids)):
+        genres.setdefault(id, []).append(str(genre))
+    return [{**row._asdict(), 'genres': sorted(genres.get(row.id, []))} for row in chunk]
+
+
+def iter_venues(chunk_size=CHUNK_SIZE):
+    query = db.session.query(*Venue.__table__.columns).order_by(Venue.id)
+    for chunk in iter_chunks(query, chunk_size):
+        yield with_genres(chunk, VenueGenre.venue_id, VenueGenre.genre)
+
+
+def iter_artists(chunk_size=CHUNK_SIZE):
+    query = db.session.query(*Artist.__table__.columns).order_by(Artist.id)
+    for chunk in iter_chunks(query, chunk_size):
+        yield with_genres(chunk, ArtistGenre.artist_id, ArtistGenre.genre)
+
+
+def iter_shows(chunk_size=CHUNK_SIZE):
+    query = db.session.query(Show.id, Show.venue_id, Venue.name.label('venue_name'),
+                             Show.artist_id, Artist.name.label('artist_name'), Show.start_time) \
+        .join(Venue, Show.venue_id == Venue.id) \
+        .join(Artist, Show.artist_id == Artist.id) \
+        .order_by(Show.id)
+    for chunk in iter_chunks(query, chunk_size):
+        yield [row._asdict() for row in chunk]
+
+
+ENTITIES = {
+    'venues': (iter_venues, [column.key for column in Venue.__table__.columns] + ['genres']),
+    'artists': (iter_artists, [column.key for column in Artist.__table__.columns] + ['genres']),
+    'shows': (iter_shows, ['id', 'venue_id', 'venue_name', 'artist_id', 'artist_name', 'start_time']),
+}
+
+
+def encode_value(value):
+    if isinstance(value, list):
+        return ','.join(value)
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def export(entity, format, chunk_size=CHUNK_SIZE):
+    '''
+        Yield the entity table encoded as jsonl or csv, one string per chunk.
+    '''
+    iter_rows, columns = ENTITIES[entity]
+    if format == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        yield buffer.getvalue()
+    for chunk in iter_rows(chunk_size):
+        if format == 'csv':
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerows([encode_value(row[column]) for column in columns] for row in chunk)
+            yield buffer.getvalue()
+        else:
+            yield ''.join(json.dumps(row, default=encode_value) + '\n' for row in chunk)
+
+
+@click.command('export-data')
+@click.argument('entity', type=click.Choice(sorted(ENTITIES)))
+@click.option('--format', 'format', type=click.Choice(sorted(FORMATS)), default='jsonl', show_default=True)
+@click.option('--output', type=click.File('w'), default='-', help='Defaults to stdout.')
+@click.option('--chunk-size', default=CHUNK_SIZE, show_default=True)
+@with_appcontext
+def export_data(entity, format, output, chunk_size):
+    '''Dump venues, artists or shows as JSON Lines or CSV.'''
+    for data in export(entity, format, chunk_size):
+        output.write(data)
@@ -0,0 +1,46 @@
+import multiprocessing
+import os
+
+'''
+    gunicorn settings, picked up from the working directory:
+        gunicorn app:app
+    Sessions are signed cookies, so requests may go to any worker on any
+    node. The page cache is shared only with CACHE_TYPE=redis: the per
+    worker lru is refused with more than one worker, whose writes would not
+    invalidate the others' pages, and left off by default.
+'''
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:{}'.format(os.environ.get('PORT', 3000)))
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+# read by config.py, which leaves the per process cache off with more than one worker
+os.environ['WEB_CONCURRENCY'] = str(workers)
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = timeout
+keepalive = 5
+
+# recycle workers now and then so slow leaks do not accumulate
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = max_requests // 10
+
+# load the app once in the master: the secret key file is created before any fork
+preload_app = True
+
+errorlog = '-'
+
+
+def on_starting(server):
+    if workers > 1 and os.environ.get('CACHE_TYPE') == 'lru':
+        raise RuntimeError('CACHE_TYPE=lru is per worker, use CACHE_TYPE=redis or null with {} workers'.format(workers))
+
+
+def post_fork(server, worker):
+    # connections opened in the master must not be shared with the workers: every engine gets a new pool,
+    # close=False leaves the inherited connections to the master, which still owns them
+    from app import app
+    from models import db
+    from routing import replica_keys
+    with app.app_context():
+        for bind in [None] + replica_keys(app):
+            db.get_engine(app, bind=bind).dispose(close=False)
+    # the async engine of ASYNC_VIEWS is disposed the same way by aio.after_fork
@@ -0,0 +1,206 @@
+import csv
+import json
+import time
+
+import click
+from flask.cli import with_appcontext
+from werkzeug.datastructures import MultiDict
+
+from forms import VenueForm, ArtistForm, ShowForm, State
+from models import db, Venue, VenueGenre, Artist, ArtistGenre, Show, bump_versions, to_genre
+from cache import invalidate, warn_local_cache
+
+'''
+    Bulk import of venues, artists and shows from CSV or JSON Lines files.
+    Every record goes through the same form validation as the create pages,
+    valid rows are written one batch (and one commit) at a time and rejected
+    rows are written to a side file together with their errors.
+'''
+
+ENTITIES = {
+    'venues': (VenueForm, Venue),
+    'artists': (ArtistForm, Artist),
+    'shows': (ShowForm, Show),
+}
+
+
+def read_records(path):
+    if path.endswith('.csv'):
+        with open(path, newline='') as file:
+            for record in csv.DictReader(file):
+                # genres are given as one comma separated cell
+                if record.get('genres'):
+                    record['genres'] = [genre.strip() for genre in record['genres'].split(',')]
+                yield record
+    else:
+        with open(path) as file:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def to_formdata(record):
+    formdata = MultiDict()
+    for key, value in record.items():
+        if value is None or value == '':
+            continue
+        if isinstance(value, bool):
+            value = 'y' if value else ''
+        for item in value if isinstance(value, list) else [value]:
+            formdata.add(key, str(item))
+    return formdata
+
+
+def validate(form_class, record):
+    form = form_class(formdata=to_formdata(record))
+    if not form.validate():
+        return None, form.errors
+    values = {}
+    for name, value in form.data.items():
+        values[name] = value.value if isinstance(value, State) else value
+    return values, None
+
+
+def insert_rows(table, rows):
+    '''
+        Insert rows with one executemany and return their ids. Drivers that
+        return ids from an executemany (psycopg2, whose execute_values sends
+        the batch as multi-row INSERTs) get the whole batch at once, others
+        (sqlite, in process) a statement per row.
+    '''
+    if db.session.get_bind().dialect.insert_executemany_returning:
+        result = db.session.execute(table.insert().return_defaults(table.c.id), rows)
+        return [key[0] for key in result.inserted_primary_key_rows]
+    return [db.session.execute(table.insert(), row).inserted_primary_key[0] for row in rows]
+
+
+def write_entities(model, link_model, link_column, rows):
+    # Core inserts of the rows and their genre links, the genres go through to_genre as with the model
+    genres = [row.pop('genres', None) or [] for row in rows]
+    ids = insert_rows(model.__table__, rows)
+    links = [{link_column: id, 'genre': genre}
+             for id, row_genres in zip(ids, genres) for genre in dict.fromkeys(map(to_genre, row_genres))]
+    if links:
+        db.session.execute(link_model.__table__.insert(), links)
+    bump_versions(model)
+    db.session.commit()
+
+
+def write_venues(rows):
+    write_entities(Venue, VenueGenre, 'venue_id', rows)
+
+
+def write_artists(rows):
+    write_entities(Artist, ArtistGenre, 'artist_id', rows)
+
+
+def write_shows(rows):
+    for row in rows:
+        row['venue_id'] = int(row['venue_id'])
+        row['artist_id'] = int(row['artist_id'])
+    db.session.execute(Show.__table__.insert(), rows)
+    bump_versions(Show)
+    # recount once per batch rather than adjusting the counters row by row
+    Venue.refresh_show_counts({row['venue_id'] for row in rows})
+    Artist.refresh_show_counts({row['artist_id'] for row in rows})
+    db.session.commit()
+    keys = set()
+    for row in rows:
+        keys.update(Show(venue_id=row['venue_id'], artist_id=row['artist_id']).cache_keys())
+    invalidate(*keys)
+
+
+def check_show_references(batch):
+    # the form only checks that the ids are numbers, reject shows pointing at missing rows
+    venue_ids = {int(values['venue_id']) for _, _, values in batch}
+    artist_ids = {int(values['artist_id']) for _, _, values in batch}
+    venue_ids = {id for id, in db.session.query(Venue.id).filter(Venue.id.in_(venue_ids))}
+    artist_ids = {id for id, in db.session.query(Artist.id).filter(Artist.id.in_(artist_ids))}
+    valid, rejected = [], []
+    for line, record, values in batch:
+        errors = {}
+        if int(values['venue_id']) not in venue_ids:
+            errors['venue_id'] = ['no venue with this id']
+        if int(values['artist_id']) not in artist_ids:
+            errors['artist_id'] = ['no artist with this id']
+        if errors:
+            rejected.append((line, record, errors))
+        else:
+            valid.append(values)
+    return valid, rejected
+
+
+WRITERS = {
+    'venues': write_venues,
+    'artists': write_artists,
+    'shows': write_shows,
+}
+
+
+def import_records(entity, records, rejects, batch_size=1000, progress=None):
+    '''
+        Validate and write records in batches. Rejected records are written
+        to the rejects file as JSON lines. Returns (imported, rejected).
+    '''
+    form_class, _ = ENTITIES[entity]
+    write = WRITERS[entity]
+    imported = rejected = 0
+
+    def reject(line, record, errors):
+        rejects.write(json.dumps({'line': line, 'record': record, 'errors': errors}, default=str) + '\n')
+
+    def flush(batch):
+        nonlocal imported, rejected
+        if entity == 'shows':
+            rows, invalid = check_show_references(batch)
+            for line, record, errors in invalid:
+                reject(line, record, errors)
+            rejected += len(invalid)
+        else:
+            rows = [values for _, _, values in batch]
+        if rows:
+            write(rows)
+        imported += len(rows)
+        if progress:
+            progress(imported, rejected)
+
+    batch = []
+    for line, record in enumerate(records, start=1):
+        values, errors = validate(form_class, record)
+        if errors:
+            reject(line, record, errors)
+            rejected += 1
+            continue
+        batch.append((line, record, values))
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+    return imported, rejected
+
+
+@click.command('import-data')
+@click.argument('entity', type=click.Choice(sorted(ENTITIES)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=1000, show_default=True, help='Rows written per commit.')
+@click.option('--rejects', 'rejects_path', type=click.Path(dir_okay=False),
+              help='Where to write rejected rows, defaults to PATH.rejected.jsonl.')
+@with_appcontext
+def import_data(entity, path, batch_size, rejects_path):
+    '''Import venues, artists or shows from a .csv or .jsonl file.'''
+    rejects_path = rejects_path or path + '.rejected.jsonl'
+    start = time.perf_counter()
+
+    def progress(imported, rejected):
+        elapsed = time.perf_counter() - start
+        click.echo('{} imported, {} rejected, {:.0f} rows/s'.format(imported, rejected, imported / elapsed))
+
+    with open(rejects_path, 'w') as rejects:
+        imported, rejected = import_records(entity, read_records(path), rejects, batch_size, progress)
+    elapsed = time.perf_counter() - start
+    click.echo('Done: {} {} imported in {:.1f}s ({:.0f} rows/s), {} rejected'.format(
+        imported, entity, elapsed, imported / elapsed if elapsed else 0, rejected))
+    if rejected:
+        click.echo('Rejected rows written to {}'.format(rejects_path))
+    warn_local_cache()
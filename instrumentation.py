@@ -0,0 +1,100 @@
+import time
+from flask import g, has_request_context, request
+from jinja2 import Template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from metrics import registry
+
+'''
+    Per request timings, enabled with INSTRUMENTATION=1.
+    SQL statements are timed with cursor events, templates by timing the
+    top level render. The totals are sent back in a Server-Timing header
+    and collected per endpoint in /metrics.
+'''
+
+REQUEST_BUCKETS = (.005, .01, .025, .05, .075, .1, .25, .5, .75, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+request_seconds = registry.histogram('fyyur_http_request_duration_seconds', 'Request wall time',
+                                     ('endpoint', 'method'), REQUEST_BUCKETS)
+requests_total = registry.counter('fyyur_http_requests_total', 'Requests served', ('endpoint', 'method', 'status'))
+sql_seconds = registry.histogram('fyyur_http_request_sql_seconds', 'Time spent in SQL statements per request',
+                                 ('endpoint',), REQUEST_BUCKETS)
+sql_queries = registry.histogram('fyyur_http_request_sql_queries', 'SQL statements executed per request',
+                                 ('endpoint',), QUERY_COUNT_BUCKETS)
+template_seconds = registry.histogram('fyyur_http_request_template_seconds', 'Time spent rendering templates per request',
+                                      ('endpoint',), REQUEST_BUCKETS)
+
+
+class Timings:
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+
+
+def current_timings():
+    return g.get('timings') if has_request_context() else None
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # one value per connection, which runs one statement at a time: a statement that raises never
+    # reaches after_cursor_execute and its start is simply replaced by the next one
+    conn.info['query_start'] = time.perf_counter()
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info.pop('query_start')
+    timings = current_timings()
+    if timings is not None:
+        timings.sql_count += 1
+        timings.sql_time += elapsed
+
+
+class TimedTemplate(Template):
+    # includes and parent templates render inside the top level render, so they are not counted twice
+
+    def render(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            timings = current_timings()
+            if timings is not None:
+                timings.template_time += time.perf_counter() - start
+
+
+def server_timing(timings, total):
+    return 'app;dur={:.1f}, db;dur={:.1f};desc="{} queries", tpl;dur={:.1f}'.format(
+        total * 1000, timings.sql_time * 1000, timings.sql_count, timings.template_time * 1000)
+
+
+def setup_instrumentation(app):
+    if not app.config['INSTRUMENTATION']:
+        return
+    # listen on the Engine class so engines created later (per bind, after fork) are covered as well
+    if not event.contains(Engine, 'before_cursor_execute', before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', after_cursor_execute)
+    app.jinja_env.template_class = TimedTemplate
+
+    @app.before_request
+    def start_timings():
+        g.timings = Timings()
+
+    @app.after_request
+    def record_timings(response):
+        timings = g.pop('timings', None)
+        if timings is None:
+            return response
+        total = time.perf_counter() - timings.start
+        endpoint = request.endpoint or 'unmatched'
+        request_seconds.observe(total, endpoint=endpoint, method=request.method)
+        requests_total.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+        sql_seconds.observe(timings.sql_time, endpoint=endpoint)
+        sql_queries.observe(timings.sql_count, endpoint=endpoint)
+        template_seconds.observe(timings.template_time, endpoint=endpoint)
+        response.headers['Server-Timing'] = server_timing(timings, total)
+        return response
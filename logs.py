@@ -0,0 +1,175 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from flask import g, has_request_context, request
+from flask.logging import default_handler
+from metrics import registry
+
+'''
+    Logging pipeline: the request threads only put records on a queue,
+    a listener thread formats them as JSON lines and writes them out.
+    A full queue drops records instead of blocking the request.
+'''
+
+records_dropped = registry.counter('fyyur_log_records_dropped_total', 'Log records dropped because the queue was full')
+
+RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JSONFormatter(logging.Formatter):
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'source': '{}:{}'.format(record.pathname, record.lineno),
+            'pid': record.process,
+        }
+        # everything passed with extra={...} and the request context added by RequestContextFilter
+        entry.update((key, value) for key, value in vars(record).items() if key not in RESERVED)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    # runs on the request thread, the listener thread has no request context
+
+    def filter(self, record):
+        if has_request_context():
+            record.method = request.method
+            record.path = request.path
+            record.remote_addr = request.remote_addr
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    # keeps a fraction of the records below WARNING for the configured loggers
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rates.get(record.name)
+        return rate is None or random.random() < rate
+
+
+class NonBlockingQueueHandler(QueueHandler):
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            records_dropped.inc()
+
+    def prepare(self, record):
+        # render the message and traceback here, but leave the JSON formatting to the listener
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def parse_rates(value):
+    # 'app.access=0.1,importer=0.5'
+    rates = {}
+    for item in filter(None, value.split(',')):
+        name, rate = item.split('=')
+        rates[name.strip()] = float(rate)
+    return rates
+
+
+def is_not_access(record):
+    return record.name != 'app.access'
+
+
+def make_output_handler(config):
+    if config['LOG_FILE'] == '-':
+        handler = logging.StreamHandler(sys.stderr)
+    else:
+        # '{pid}' in the file name gives each worker its own file, rotation is not safe across processes
+        handler = RotatingFileHandler(config['LOG_FILE'].format(pid=os.getpid()), maxBytes=config['LOG_MAX_BYTES'],
+                                      backupCount=config['LOG_BACKUP_COUNT'], delay=True)
+    handler.setFormatter(JSONFormatter())
+    return handler
+
+
+class LogPipeline:
+
+    def __init__(self, config):
+        self.config = config
+        self.handler = NonBlockingQueueHandler(queue.Queue(config['LOG_QUEUE_SIZE']))
+        self.handler.addFilter(SamplingFilter(parse_rates(config['LOG_SAMPLE_RATES'])))
+        self.handler.addFilter(RequestContextFilter())
+        self.listener = None
+
+    def start(self):
+        handlers = [make_output_handler(self.config)]
+        if self.config['DEBUG'] and self.config['LOG_FILE'] != '-':
+            # in debug the records also show on the console, as with Flask's default handler
+            console = logging.StreamHandler(sys.stderr)
+            console.setFormatter(default_handler.formatter)
+            console.addFilter(is_not_access)
+            handlers.append(console)
+        self.listener = QueueListener(self.handler.queue, *handlers, respect_handler_level=True)
+        self.listener.start()
+
+    def stop(self):
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    def after_fork(self):
+        # threads do not survive fork, a preloaded app needs a new queue and listener in each worker
+        self.listener = None
+        self.handler.queue = queue.Queue(self.config['LOG_QUEUE_SIZE'])
+        self.start()
+
+
+def setup_logging(app):
+    pipeline = LogPipeline(app.config)
+    pipeline.start()
+    atexit.register(pipeline.stop)
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=pipeline.after_fork)
+
+    app.logger.setLevel(app.config['LOG_LEVEL'])
+    app.logger.addHandler(pipeline.handler)
+    # the default handler writes to stderr on the request thread, the listener has a console handler in debug
+    app.logger.removeHandler(default_handler)
+    access = logging.getLogger('app.access')
+    access.setLevel(logging.INFO)
+    access.propagate = False
+    access.addHandler(pipeline.handler)
+
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def log_request(response):
+        started = g.pop('request_started', None)
+        if started is not None:
+            elapsed = time.perf_counter() - started
+            access.info('%s %s %s', request.method, request.full_path.rstrip('?'), response.status_code,
+                        extra={'status': response.status_code, 'duration_ms': round(elapsed * 1000, 2)})
+        return response
+
+    return pipeline
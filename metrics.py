@@ -0,0 +1,144 @@
+from threading import Lock
+import bisect
+
+'''
+    Process local metrics in the Prometheus text format.
+    Every worker keeps its own registry, scrape each worker or aggregate by instance.
+'''
+
+DEFAULT_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+
+
+def format_labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(name, str(value).replace('"', '\\"'))
+                          for name, value in zip(names, values)) + '}'
+
+
+def format_value(value):
+    return repr(float(value)) if value != float('inf') else '+Inf'
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, description, labels=()):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self.lock = Lock()
+
+    def label_values(self, labels):
+        return tuple(labels[name] for name in self.labels)
+
+    def render(self):
+        lines = ['# HELP {} {}'.format(self.name, self.description), '# TYPE {} {}'.format(self.name, self.kind)]
+        lines.extend(self.samples())
+        return lines
+
+    def samples(self):
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, name, description, labels=()):
+        super().__init__(name, description, labels)
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self.label_values(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            values = list(self.values.items())
+        return ['{}{} {}'.format(self.name, format_labels(self.labels, key), format_value(value))
+                for key, value in values]
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def __init__(self, name, description, labels=(), collect=None):
+        # collect() returns {label values: value} and is called on every scrape
+        super().__init__(name, description, labels)
+        self.values = {}
+        self.collect = collect
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[self.label_values(labels)] = value
+
+    def samples(self):
+        values = self.collect() if self.collect else self.values
+        with self.lock:
+            values = list(values.items())
+        return ['{}{} {}'.format(self.name, format_labels(self.labels, key), format_value(value))
+                for key, value in values]
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, description, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(buckets)
+        self.series = {}
+
+    def observe(self, value, **labels):
+        key = self.label_values(labels)
+        with self.lock:
+            counts, total = self.series.get(key, (None, 0))
+            if counts is None:
+                counts = [0] * (len(self.buckets) + 1)
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.series[key] = (counts, total + value)
+
+    def samples(self):
+        lines = []
+        with self.lock:
+            series = [(key, list(counts), total) for key, (counts, total) in self.series.items()]
+        for key, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                lines.append('{}_bucket{} {}'.format(self.name, format_labels(self.labels + ('le',), key + (format_value(bound),)),
+                                                     cumulative))
+            labels = format_labels(self.labels, key)
+            lines.append('{}_sum{} {}'.format(self.name, labels, format_value(total)))
+            lines.append('{}_count{} {}'.format(self.name, labels, cumulative))
+        return lines
+
+
+class Registry:
+
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        # metrics are registered at import time, re-registering returns the existing one
+        return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, description, labels=()):
+        return self.register(Counter(name, description, labels))
+
+    def gauge(self, name, description, labels=(), collect=None):
+        return self.register(Gauge(name, description, labels, collect))
+
+    def histogram(self, name, description, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, description, labels, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
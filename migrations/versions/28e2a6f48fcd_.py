@@ -0,0 +1,32 @@
+"""trigram indexes for name search
+
+Revision ID: 28e2a6f48fcd
+Revises: 345bf43e3a7b
+Create Date: 2026-10-18 09:12:41.503114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '28e2a6f48fcd'
+down_revision = '345bf43e3a7b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # gin_trgm_ops only exists once pg_trgm is installed; on other databases
+    # the postgresql_* options are ignored and plain indexes are created
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index('ix_Venue_name_trgm', 'Venue', ['name'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+    op.create_index('ix_Artist_name_trgm', 'Artist', ['name'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+
+
+def downgrade():
+    op.drop_index('ix_Artist_name_trgm', table_name='Artist')
+    op.drop_index('ix_Venue_name_trgm', table_name='Venue')
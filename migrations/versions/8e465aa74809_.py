@@ -0,0 +1,101 @@
+"""move genres into VenueGenre and ArtistGenre tables
+
+Revision ID: 8e465aa74809
+Revises: 3546210a4c64
+Create Date: 2026-10-18 11:20:03.417286
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '8e465aa74809'
+down_revision = '3546210a4c64'
+branch_labels = None
+depends_on = None
+
+GENRES = ('Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk', 'Funk', 'HipHop', 'HeavyMetal',
+          'Instrumental', 'Jazz', 'MusicalTheatre', 'Pop', 'Punk', 'RB', 'Reggae', 'RocknRoll', 'Soul', 'Swing',
+          'Other')
+
+
+def genre_type(bind):
+    # both tables share one postgres enum type, so create it once up front
+    genre = sa.Enum(*GENRES, name='genre')
+    genre.create(bind, checkfirst=True)
+    if bind.dialect.name == 'postgresql':
+        return postgresql.ENUM(*GENRES, name='genre', create_type=False)
+    return genre
+
+
+# labels of the genres, as posted by the forms, by name
+LABELS = {'HipHop': 'Hip-Hop', 'HeavyMetal': 'Heavy Metal', 'MusicalTheatre': 'Musical Theatre', 'RB': 'R&B',
+          'RocknRoll': 'Rock n Roll'}
+NAMES = {**{name: name for name in GENRES}, **{label: name for name, label in LABELS.items()}}
+
+
+def parse_genres(value):
+    # genres used to be stored as postgres array literals such as {Jazz,Blues}, some rows hold
+    # labels such as {Hip-Hop,"Rock n Roll"}; returns (genre names, values that are no genre)
+    values = [value.strip().strip('"').strip() for value in (value or '').strip('{}').split(',')]
+    values = [value for value in values if value]
+    return [NAMES[value] for value in values if value in NAMES], [value for value in values if value not in NAMES]
+
+
+def genre_rows(bind, table, key):
+    rows, unknown = [], []
+    for id, genres in bind.execute(sa.text('SELECT id, genres FROM "{}"'.format(table))).fetchall():
+        names, others = parse_genres(genres)
+        rows.extend({key: id, 'genre': name} for name in sorted(set(names)))
+        unknown.extend('{} {}: {}'.format(table, id, value) for value in others)
+    return rows, unknown
+
+
+def upgrade():
+    bind = op.get_bind()
+    venue_rows, venue_unknown = genre_rows(bind, 'Venue', 'venue_id')
+    artist_rows, artist_unknown = genre_rows(bind, 'Artist', 'artist_id')
+    if venue_unknown or artist_unknown:
+        # fix or remove these values and run the upgrade again rather than lose them
+        raise RuntimeError('genres that are not a Genre name or label:\n' + '\n'.join(venue_unknown + artist_unknown))
+    genre = genre_type(bind)
+    venue_genre = op.create_table('VenueGenre',
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.Column('genre', genre, nullable=False),
+    sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('venue_id', 'genre')
+    )
+    artist_genre = op.create_table('ArtistGenre',
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('genre', genre, nullable=False),
+    sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('artist_id', 'genre')
+    )
+    if venue_rows:
+        op.bulk_insert(venue_genre, venue_rows)
+    if artist_rows:
+        op.bulk_insert(artist_genre, artist_rows)
+    with op.batch_alter_table('Venue') as batch_op:
+        batch_op.drop_column('genres')
+    with op.batch_alter_table('Artist') as batch_op:
+        batch_op.drop_column('genres')
+
+
+def downgrade():
+    bind = op.get_bind()
+    with op.batch_alter_table('Venue') as batch_op:
+        batch_op.add_column(sa.Column('genres', sa.String(length=120), nullable=True))
+    with op.batch_alter_table('Artist') as batch_op:
+        batch_op.add_column(sa.Column('genres', sa.String(length=120), nullable=True))
+    for table, link, key in (('Venue', 'VenueGenre', 'venue_id'), ('Artist', 'ArtistGenre', 'artist_id')):
+        genres = {}
+        for id, name in bind.execute(sa.text('SELECT {}, genre FROM "{}"'.format(key, link))):
+            genres.setdefault(id, []).append(name)
+        for id, names in genres.items():
+            bind.execute(sa.text('UPDATE "{}" SET genres = :genres WHERE id = :id'.format(table)),
+                         {'genres': '{' + ','.join(sorted(names)) + '}', 'id': id})
+    op.drop_table('ArtistGenre')
+    op.drop_table('VenueGenre')
+    sa.Enum(*GENRES, name='genre').drop(bind, checkfirst=True)
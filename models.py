@@ -1,25 +1,431 @@
-from flask_sqlalchemy import SQLAlchemy
+from flask import abort
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import NullPool, QueuePool
+from sqlalchemy.ext.associationproxy import association_proxy
 from forms import Genre
+from cache import cache, invalidate, make_key
 from datetime import datetime
+import base64
+import binascii
+import json
+import time
+import weakref
+from metrics import registry
+from routing import RoutingSession, RoutingSQLAlchemy, setup_replicas
 
-db = SQLAlchemy()
+db = RoutingSQLAlchemy()
 
 '''
     Setup database
 '''
 
 
+pool_checkout_seconds = registry.histogram('fyyur_db_pool_checkout_seconds',
+                                           'Time spent waiting for a pooled database connection')
+pool_checkout_timeouts = registry.counter('fyyur_db_pool_checkout_timeouts_total',
+                                          'Checkouts that gave up after DB_POOL_TIMEOUT')
+pools = weakref.WeakSet()
+
+
+class InstrumentedQueuePool(QueuePool):
+    # QueuePool that records how long each checkout waited, a slow checkout means
+    # the pool is too small for the worker's concurrency (or connections leak)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        pools.add(self)
+
+    def recreate(self):
+        pool = super().recreate()
+        pools.discard(self)
+        return pool
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            pool_checkout_timeouts.inc()
+            raise
+        finally:
+            pool_checkout_seconds.observe(time.perf_counter() - start)
+
+
+def collect_pool_stat(stat):
+    return lambda: {(): sum(getattr(pool, stat)() for pool in list(pools))}
+
+
+registry.gauge('fyyur_db_pool_size', 'Connections kept open by the pool', collect=collect_pool_stat('size'))
+registry.gauge('fyyur_db_pool_checked_out', 'Connections currently in use', collect=collect_pool_stat('checkedout'))
+registry.gauge('fyyur_db_pool_idle', 'Idle connections in the pool', collect=collect_pool_stat('checkedin'))
+registry.gauge('fyyur_db_pool_overflow', 'Connections opened above the pool size (negative while the pool fills up)',
+               collect=collect_pool_stat('overflow'))
+
+
+def engine_options(config):
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    options = dict(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    if url.get_backend_name() == 'sqlite':
+        # sqlite uses its own single connection pools, the pool settings do not apply
+        return options
+    if config['DB_EXTERNAL_POOL']:
+        # pgbouncer (or another pooler) owns the connections, keep none open in the worker
+        options.setdefault('poolclass', NullPool)
+    else:
+        options.setdefault('poolclass', InstrumentedQueuePool)
+        options.setdefault('pool_size', config['DB_POOL_SIZE'])
+        options.setdefault('max_overflow', config['DB_MAX_OVERFLOW'])
+        options.setdefault('pool_timeout', config['DB_POOL_TIMEOUT'])
+        options.setdefault('pool_recycle', config['DB_POOL_RECYCLE'])
+        options.setdefault('pool_pre_ping', config['DB_POOL_PRE_PING'])
+    if url.get_backend_name() == 'postgresql' and config['DB_STATEMENT_TIMEOUT'] \
+            and not config['DB_EXTERNAL_POOL']:
+        # startup options are rejected by pgbouncer, set the timeout on the role there instead
+        connect_args = dict(options.get('connect_args') or {})
+        connect_args.setdefault('options', '-c statement_timeout={}'.format(config['DB_STATEMENT_TIMEOUT']))
+        options['connect_args'] = connect_args
+    return options
+
+
 def setup_db(app):
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
+    setup_replicas(app)
     db.app = app
     db.init_app(app)
 
 
+'''
+    Search
+'''
+
+SEARCH_LIMIT = 50
+
+
+def parse_start_time(keyword):
+    # a search term can also be a start time, such as 2030-01-01 20:00:00
+    try:
+        return datetime.fromisoformat(keyword.strip())
+    except ValueError:
+        return None
+
+
+def search_results(rows, limit=SEARCH_LIMIT):
+    # the searches fetch one row more than they show, (rows, whether there were more)
+    rows = list(rows)
+    return rows[:limit], len(rows) > limit
+
+
+def rank_by_name(query, keyword, *columns, limit=SEARCH_LIMIT + 1):
+    # on postgres the ilike filters are answered by the pg_trgm GIN indexes,
+    # so rank by trigram similarity; other databases fall back to name order
+    if db.engine.dialect.name == 'postgresql':
+        query = query.order_by(db.func.greatest(*[db.func.similarity(column, keyword) for column in columns]).desc(),
+                               *columns)
+    else:
+        query = query.order_by(*columns)
+    return query.limit(limit)
+
+
+'''
+    Pagination
+'''
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+PAST_SHOWS_LIMIT = 30
+
+
+class Page:
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+
+def page_data(entity, genres, counts, shows_modified, upcoming_shows, past_shows):
+    # the venue or artist page as plain data that can be cached, shared by the sync and async views
+    upcoming_shows_count, past_shows_count = counts
+    return {
+        **entity.to_dict(),
+        'last_modified': max(entity.updated_at, shows_modified) if shows_modified else entity.updated_at,
+        'genres': list(genres),
+        'upcoming_shows': [row._asdict() for row in upcoming_shows],
+        'past_shows': [row._asdict() for row in past_shows],
+        'upcoming_shows_count': upcoming_shows_count,
+        'past_shows_count': past_shows_count
+    }
+
+
+def encode_cursor(row, columns):
+    values = [getattr(row, column.key) for column in columns]
+    data = json.dumps([value.isoformat() if isinstance(value, datetime) else value for value in values])
+    return base64.urlsafe_b64encode(data.encode()).decode()
+
+
+def decode_cursor(cursor, columns):
+    # None for anything that is not a cursor of these columns, a forged value of the wrong type
+    # would make postgres reject the comparison
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not isinstance(values, list) or len(values) != len(columns):
+            return None
+        values = [datetime.fromisoformat(value) if isinstance(column.type, db.DateTime) else value
+                  for column, value in zip(columns, values)]
+        if any(type(value) is not column.type.python_type and not (value is None and column.nullable)
+               for column, value in zip(columns, values)):
+            return None
+        return values
+    except (binascii.Error, ValueError, TypeError):
+        return None
+
+
+def page_args(args):
+    '''
+        Cursor and page size of a listing request, and its genre filter:
+        ?genre=Jazz&genre=Blues matches either genre, add &match=all to
+        require both. An unknown genre aborts with 400.
+    '''
+    page_size = args.get('page_size', PAGE_SIZE, type=int)
+    try:
+        genres = [to_genre(genre) for genre in args.getlist('genre')]
+    except (KeyError, ValueError):
+        abort(400)
+    return {
+        'after': args.get('after'),
+        'before': args.get('before'),
+        'limit': max(1, min(page_size, MAX_PAGE_SIZE))
+    }, {
+        'genres': genres,
+        'match_all': args.get('match') == 'all'
+    }
+
+
+def get_genre_page(model, paging, genres, load, version=None):
+    '''
+        Genre filtered listing pages are cached, keyed by the version of the
+        model's table (see get_table_versions) so a write moves on to new
+        keys and the old ones expire. Unfiltered pages are a plain index scan
+        and are loaded directly.
+    '''
+    if not genres['genres']:
+        return load()
+    if version is None:
+        version = get_table_versions(model)[0]
+    key = make_key(model.__tablename__.lower() + 's', version,
+                   ','.join(sorted({genre.name for genre in genres['genres']})),
+                   'all' if genres['match_all'] else 'any', paging['after'], paging['before'], paging['limit'])
+    return cache.get_or_set(key, load)
+
+
+def sort_key(column):
+    # NULL compares to nothing, a nullable (string) column sorts and compares as ''
+    return db.func.coalesce(column, '') if column.nullable else column
+
+
+def sort_values(columns, values):
+    return [('' if value is None else value) if column.nullable else value for column, value in zip(columns, values)]
+
+
+def paginate(query, columns, after=None, before=None, limit=PAGE_SIZE):
+    '''
+        Keyset pagination: rows are ordered by columns and a page starts right
+        after (or ends right before) the cursor row, so deep pages cost the same
+        as the first one. Rows must expose every column by its key, nullable
+        columns must be strings.
+    '''
+    sort_keys = [sort_key(column) for column in columns]
+    keys = db.tuple_(*sort_keys)
+    before_values = decode_cursor(before, columns) if before else None
+    after_values = decode_cursor(after, columns) if after else None
+    if before_values:
+        query = query.filter(keys < db.tuple_(*sort_values(columns, before_values))) \
+            .order_by(*[key.desc() for key in sort_keys])
+    else:
+        if after_values:
+            query = query.filter(keys > db.tuple_(*sort_values(columns, after_values)))
+        query = query.order_by(*sort_keys)
+    rows = query.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if before_values:
+        rows.reverse()
+    if not rows:
+        return Page(rows)
+    has_next = has_more if not before_values else True
+    has_prev = has_more if before_values else bool(after_values)
+    return Page(rows,
+                next_cursor=encode_cursor(rows[-1], columns) if has_next else None,
+                prev_cursor=encode_cursor(rows[0], columns) if has_prev else None)
+
+
+'''
+    Versions
+'''
+
+
+# listing tables and the table whose version a write to them bumps
+VERSIONED_TABLES = {'Venue': 'Venue', 'VenueGenre': 'Venue', 'Artist': 'Artist', 'ArtistGenre': 'Artist',
+                    'Show': 'Show'}
+
+
+class TableVersion(db.Model):
+    # one row per listing table, bumped in the transaction of every write to it
+    __tablename__ = 'TableVersion'
+
+    name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, server_default=db.func.now())
+
+
+@event.listens_for(TableVersion.__table__, 'after_create')
+def create_table_versions(table, connection, **kwargs):
+    connection.execute(table.insert(), [{'name': name, 'version': 0, 'updated_at': datetime.utcnow()}
+                                        for name in sorted(set(VERSIONED_TABLES.values()))])
+
+
+def bump_versions(*models):
+    # for writes that bypass the flush (bulk inserts, counter updates), bumped when the session commits
+    db.session.info.setdefault('versions', set()).update(VERSIONED_TABLES[model.__tablename__] for model in models)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def collect_versions(session, flush_context):
+    session.info.setdefault('versions', set()).update(
+        instance.__tablename__ for instance in (*session.new, *session.dirty, *session.deleted)
+        if getattr(instance, '__tablename__', None) in VERSIONED_TABLES)
+
+
+@event.listens_for(RoutingSession, 'before_commit')
+def commit_versions(session):
+    # one update per transaction, however many flushes it took
+    session.flush()
+    names = sorted({VERSIONED_TABLES[name] for name in session.info.pop('versions', ())})
+    if names:
+        session.execute(TableVersion.__table__.update()
+                        .where(TableVersion.name.in_(names))
+                        .values(version=TableVersion.version + 1, updated_at=datetime.utcnow()))
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def discard_versions(session):
+    session.info.pop('versions', None)
+
+
+@db.read_only
+def get_table_versions(*models):
+    '''
+        Version and time of the last write of each model's table, read by
+        primary key in one round trip whatever the size of the tables. They
+        change on every insert, update and delete, so they can validate
+        cached copies of pages listing those tables.
+    '''
+    names = [VERSIONED_TABLES[model.__tablename__] for model in models]
+    rows = dict((name, (version, updated_at)) for name, version, updated_at in
+                db.session.query(TableVersion.name, TableVersion.version, TableVersion.updated_at)
+                .filter(TableVersion.name.in_(names)))
+    return tuple(value for name in names for value in rows.get(name, (None, None)))
+
+
 # ---------------------------
 # Models
 # ---------------------------
 
+def to_genre(genre):
+    # accepts a Genre, a genre name (as stored) or a genre label (as posted by the forms)
+    if isinstance(genre, Genre):
+        return genre
+    return Genre[genre] if genre in Genre.__members__ else Genre(genre)
+
+
+def filter_by_genres(query, id_column, link_id_column, link_genre_column, genres, match_all=False):
+    '''
+        Keep rows whose id has any (or, with match_all, every) one of genres.
+        The genre lookup is answered from the (genre, id) index of the link table.
+    '''
+    ids = db.session.query(link_id_column).filter(link_genre_column.in_(genres))
+    if match_all:
+        ids = ids.group_by(link_id_column).having(db.func.count() == len(set(genres)))
+    return query.filter(id_column.in_(ids))
+
+
+'''
+    Show counters
+'''
+
+
+def show_counts(column, now):
+    # upcoming and past shows per venue (or artist) id, counted from Show
+    return db.session.query(column.label('id'),
+                            db.func.count(db.case((Show.start_time >= now, 1))).label('upcoming'),
+                            db.func.count(db.case((Show.start_time < now, 1))).label('past')) \
+        .group_by(column)
+
+
+def refresh_show_counts(model, column, ids=None):
+    '''
+        Recount the shows of the given rows, or of every row. Returns the
+        number of rows updated, the caller commits.
+    '''
+    now = datetime.now()
+    shows = db.session.query(Show.id).filter(column == model.id)
+    values = {
+        model.upcoming_shows_count: shows.filter(Show.start_time >= now).with_entities(db.func.count(Show.id))
+                                         .scalar_subquery(),
+        model.past_shows_count: shows.filter(Show.start_time < now).with_entities(db.func.count(Show.id))
+                                     .scalar_subquery(),
+        model.next_show_at: shows.filter(Show.start_time >= now).with_entities(db.func.min(Show.start_time))
+                                 .scalar_subquery(),
+    }
+    query = db.session.query(model)
+    if ids is not None:
+        if not ids:
+            return 0
+        query = query.filter(model.id.in_(ids))
+    bump_versions(model)
+    return query.update(values, synchronize_session=False)
+
+
+def check_show_counts(model, column):
+    # rows whose counters differ from a recount, with next_show_at to tell stale rows awaiting a refresh
+    now = datetime.now()
+    counts = show_counts(column, now).subquery()
+    upcoming = db.func.coalesce(counts.c.upcoming, 0)
+    past = db.func.coalesce(counts.c.past, 0)
+    return db.session.query(model.id, model.upcoming_shows_count, model.past_shows_count, model.next_show_at,
+                            upcoming.label('upcoming'), past.label('past')) \
+        .outerjoin(counts, counts.c.id == model.id) \
+        .filter(db.or_(model.upcoming_shows_count != upcoming, model.past_shows_count != past)) \
+        .order_by(model.id) \
+        .all()
+
+
+class VenueGenre(db.Model):
+    __tablename__ = 'VenueGenre'
+    __table_args__ = (
+        db.Index('ix_VenueGenre_genre_venue_id', 'genre', 'venue_id'),
+    )
+
+    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'), primary_key=True)
+    genre = db.Column(db.Enum(Genre, name='genre'), primary_key=True)
+
+
+class ArtistGenre(db.Model):
+    __tablename__ = 'ArtistGenre'
+    __table_args__ = (
+        db.Index('ix_ArtistGenre_genre_artist_id', 'genre', 'artist_id'),
+    )
+
+    artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'), primary_key=True)
+    genre = db.Column(db.Enum(Genre, name='genre'), primary_key=True)
+
+
 class Venue(db.Model):
     __tablename__ = 'Venue'
+    __table_args__ = (
+        db.Index('ix_Venue_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_Venue_next_show_at', 'next_show_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
@@ -27,43 +433,95 @@ class Venue(db.Model):
     state = db.Column(db.String(120))
     address = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(db.String(120))
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     website_link = db.Column(db.String(120))
     seeking_talent = db.Column(db.Boolean(), default=False)
     seeking_description = db.Column(db.Text())
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, server_default=db.func.now())
+    # maintained by Show.insert/delete, shows that start move from upcoming to past with refresh_show_counts
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # earliest upcoming show as of the last count (a lower bound after deletes)
+    next_show_at = db.Column(db.DateTime)
     shows = db.relationship('Show', backref='Venue', lazy=True)
+    genre_links = db.relationship('VenueGenre', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
+    # list of Genre members, decoded by the Enum column
+    genres = association_proxy('genre_links', 'genre', creator=lambda genre: VenueGenre(genre=to_genre(genre)))
 
     def insert(self):
         db.session.add(self)
         db.session.commit()
+        invalidate(*self.cache_keys())
 
     def update(self):
+        keys = self.cache_keys()
+        # set explicitly, a genre change only writes to the link table
+        self.updated_at = datetime.utcnow()
         db.session.commit()
+        invalidate(*keys)
 
     def delete(self):
+        keys = self.cache_keys()
         db.session.delete(self)
         db.session.commit()
+        invalidate(*keys)
+
+    def cache_keys(self):
+        # this venue's page and the pages of the artists that list it under their shows
+        artist_ids = db.session.query(Show.artist_id).filter(Show.venue_id == self.id).distinct()
+        return [make_key('venue', self.id)] + [make_key('artist', artist_id) for artist_id, in artist_ids]
+
+    def to_dict(self):
+        return {column.key: getattr(self, column.key) for column in Venue.__table__.columns}
 
     @classmethod
     def get_venue(cls, venue_id):
         return Venue.query.get(venue_id)
 
     @classmethod
-    def get_venues(cls):
-        return Venue.query.all()
+    def get_page(cls, venue_id):
+        # everything the venue page shows, as plain data that can be cached
+        venue = Venue.get_venue(venue_id)
+        if venue is None:
+            return None
+        return page_data(venue, venue.genres, Show.count_shows(Show.venue_id, venue_id),
+                         Show.get_last_modified(Show.venue_id, venue_id),
+                         Show.get_show_by_venue_id(venue_id, upcoming=True),
+                         Show.get_show_by_venue_id(venue_id, upcoming=False, limit=PAST_SHOWS_LIMIT))
+
+    @classmethod
+    @db.read_only
+    def get_venues(cls, after=None, before=None, limit=PAGE_SIZE):
+        return paginate(Venue.query, [Venue.id], after=after, before=before, limit=limit)
+
+    @classmethod
+    @db.read_only
+    def get_venue_areas(cls, genres=None, match_all=False, after=None, before=None, limit=PAGE_SIZE):
+        # one row per venue, already sorted by area, with its maintained upcoming show counter
+        query = db.session.query(Venue.state, Venue.city, Venue.id, Venue.name,
+                                 Venue.upcoming_shows_count.label('num_upcoming_shows'))
+        if genres:
+            query = filter_by_genres(query, Venue.id, VenueGenre.venue_id, VenueGenre.genre, genres, match_all)
+        return paginate(query, [Venue.state, Venue.city, Venue.id], after=after, before=before, limit=limit)
 
     @classmethod
+    def refresh_show_counts(cls, ids=None):
+        return refresh_show_counts(Venue, Show.venue_id, ids)
+
+    @classmethod
+    def check_show_counts(cls):
+        return check_show_counts(Venue, Show.venue_id)
+
+    @classmethod
+    @db.read_only
     def search_venue_by_keyword(cls, keyword):
-        return Venue.query.filter(Venue.name.ilike('%{}%'.format(keyword))).all()
+        return db.session.execute(Venue.select_venue_by_keyword(keyword)).scalars().all()
 
     @classmethod
-    def convert_genre_name_to_label(cls, genre_names):
-        genres = []
-        for genre in genre_names:
-            genres.append(Genre[genre])
-        return genres
+    def select_venue_by_keyword(cls, keyword):
+        statement = db.select(Venue).filter(Venue.name.ilike('%{}%'.format(keyword)))
+        return rank_by_name(statement, keyword, Venue.name)
 
     @classmethod
     def convert_genre_label_to_name(cls, genre_labels):
@@ -72,56 +530,101 @@ class Venue(db.Model):
             genres.append(Genre.coerce(genre))
         return [genre.name for genre in genres]
 
-    @classmethod
-    def convert_genre_object_to_array(cls, genres):
-        return genres.replace('{', '').replace('}', '').split(',')
-
 
 class Artist(db.Model):
     __tablename__ = 'Artist'
+    __table_args__ = (
+        db.Index('ix_Artist_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_Artist_next_show_at', 'next_show_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(db.String(120))
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     website_link = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean(), default=False)
     seeking_description = db.Column(db.Text())
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, server_default=db.func.now())
+    # maintained by Show.insert/delete, shows that start move from upcoming to past with refresh_show_counts
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # earliest upcoming show as of the last count (a lower bound after deletes)
+    next_show_at = db.Column(db.DateTime)
     shows = db.relationship('Show', backref='Artist', lazy=True)
+    genre_links = db.relationship('ArtistGenre', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
+    # list of Genre members, decoded by the Enum column
+    genres = association_proxy('genre_links', 'genre', creator=lambda genre: ArtistGenre(genre=to_genre(genre)))
 
     def insert(self):
         db.session.add(self)
         db.session.commit()
+        invalidate(*self.cache_keys())
 
     def update(self):
+        keys = self.cache_keys()
+        # set explicitly, a genre change only writes to the link table
+        self.updated_at = datetime.utcnow()
         db.session.commit()
+        invalidate(*keys)
 
     def delete(self):
+        keys = self.cache_keys()
         db.session.delete(self)
         db.session.commit()
+        invalidate(*keys)
+
+    def cache_keys(self):
+        # this artist's page and the pages of the venues that list it under their shows
+        venue_ids = db.session.query(Show.venue_id).filter(Show.artist_id == self.id).distinct()
+        return [make_key('artist', self.id)] + [make_key('venue', venue_id) for venue_id, in venue_ids]
+
+    def to_dict(self):
+        return {column.key: getattr(self, column.key) for column in Artist.__table__.columns}
 
     @classmethod
     def get_artist(cls, artist_id):
         return Artist.query.get(artist_id)
 
     @classmethod
-    def get_artists(cls):
-        return Artist.query.with_entities(Artist.id, Artist.name).all()
+    def get_page(cls, artist_id):
+        # everything the artist page shows, as plain data that can be cached
+        artist = Artist.get_artist(artist_id)
+        if artist is None:
+            return None
+        return page_data(artist, artist.genres, Show.count_shows(Show.artist_id, artist_id),
+                         Show.get_last_modified(Show.artist_id, artist_id),
+                         Show.get_show_by_artist_id(artist_id, upcoming=True),
+                         Show.get_show_by_artist_id(artist_id, upcoming=False, limit=PAST_SHOWS_LIMIT))
 
     @classmethod
+    @db.read_only
+    def get_artists(cls, genres=None, match_all=False, after=None, before=None, limit=PAGE_SIZE):
+        query = Artist.query.with_entities(Artist.id, Artist.name)
+        if genres:
+            query = filter_by_genres(query, Artist.id, ArtistGenre.artist_id, ArtistGenre.genre, genres, match_all)
+        return paginate(query, [Artist.id], after=after, before=before, limit=limit)
+
+    @classmethod
+    def refresh_show_counts(cls, ids=None):
+        return refresh_show_counts(Artist, Show.artist_id, ids)
+
+    @classmethod
+    def check_show_counts(cls):
+        return check_show_counts(Artist, Show.artist_id)
+
+    @classmethod
+    @db.read_only
     def search_artist_by_keyword(cls, keyword):
-        return Artist.query.filter(Artist.name.ilike('%{}%'.format(keyword))).all()
+        return db.session.execute(Artist.select_artist_by_keyword(keyword)).scalars().all()
 
     @classmethod
-    def convert_genre_name_to_label(cls, genre_names):
-        genres = []
-        for genre in genre_names:
-            genres.append(Genre[genre])
-        return genres
+    def select_artist_by_keyword(cls, keyword):
+        statement = db.select(Artist).filter(Artist.name.ilike('%{}%'.format(keyword)))
+        return rank_by_name(statement, keyword, Artist.name)
 
     @classmethod
     def convert_genre_label_to_name(cls, genre_labels):
@@ -130,74 +633,156 @@ class Artist(db.Model):
             genres.append(Genre.coerce(genre))
         return [genre.name for genre in genres]
 
-    @classmethod
-    def convert_genre_object_to_array(cls, genres):
-        return genres.replace('{', '').replace('}', '').split(',')
-
 
 class Show(db.Model):
     __tablename__ = 'Show'
+    __table_args__ = (
+        db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_Show_start_time_id', 'start_time', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'))
     venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'))
     start_time = db.Column(db.DateTime, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, server_default=db.func.now())
 
     def insert(self):
         db.session.add(self)
+        self.update_show_counts()
         db.session.commit()
+        invalidate(*self.cache_keys())
+
+    def delete(self):
+        keys = self.cache_keys()
+        db.session.delete(self)
+        db.session.flush()
+        # the show may have started since the counters were last refreshed, so it cannot tell which counter
+        # it was counted in: recount the venue and the artist
+        for model, entity_id in ((Venue, self.venue_id), (Artist, self.artist_id)):
+            if entity_id is not None:
+                model.refresh_show_counts([entity_id])
+        db.session.commit()
+        invalidate(*keys)
+
+    def update_show_counts(self):
+        # add the new show to the venue and artist counters in the same transaction, in SQL so concurrent
+        # writes add up
+        upcoming = self.start_time >= datetime.now()
+        for model, entity_id in ((Venue, self.venue_id), (Artist, self.artist_id)):
+            if upcoming:
+                values = {
+                    model.upcoming_shows_count: model.upcoming_shows_count + 1,
+                    model.next_show_at: db.case(
+                        (db.or_(model.next_show_at.is_(None), model.next_show_at > self.start_time), self.start_time),
+                        else_=model.next_show_at),
+                }
+            else:
+                values = {model.past_shows_count: model.past_shows_count + 1}
+            db.session.query(model).filter(model.id == entity_id).update(values, synchronize_session=False)
+        bump_versions(Venue, Artist)
+
+    def cache_keys(self):
+        return [make_key('venue', self.venue_id), make_key('artist', self.artist_id)]
 
     @classmethod
-    def get_shows(cls):
-        return Show.query.join(Venue, Show.venue_id == Venue.id) \
-            .add_columns(Show.venue_id, Venue.name) \
-            .join(Artist, Show.artist_id == Artist.id) \
-            .add_columns(Show.artist_id, Artist.name, Artist.image_link, Show.start_time) \
-            .all()
+    @db.read_only
+    def get_shows(cls, after=None, before=None, limit=PAGE_SIZE):
+        query = db.session.query(Show.id, Show.venue_id, Venue.name.label('venue_name'),
+                                 Show.artist_id, Artist.name.label('artist_name'),
+                                 Artist.image_link.label('artist_image_link'), Show.start_time) \
+            .join(Venue, Show.venue_id == Venue.id) \
+            .join(Artist, Show.artist_id == Artist.id)
+        return paginate(query, [Show.start_time, Show.id], after=after, before=before, limit=limit)
 
     @classmethod
-    def get_all_upcomming_show_by_venues(cls, venues):
-        return Show.query.filter(Show.venue_id.in_([venue.id for venue in venues]),
-                                 Show.start_time >= datetime.now()).all()
+    def get_show_by_venue_id(cls, venue_id, upcoming=True, limit=None):
+        return db.session.execute(Show.select_show_by_venue_id(venue_id, upcoming, limit)).all()
 
     @classmethod
-    def get_show_by_venue_id(cls, venue_id):
-        return Show.query \
+    def select_show_by_venue_id(cls, venue_id, upcoming=True, limit=None):
+        statement = db.select(Show.id, Artist.id.label('artist_id'), Artist.name.label('artist_name'),
+                              Artist.image_link.label('artist_image_link'), Show.start_time) \
             .join(Artist, Artist.id == Show.artist_id) \
-            .add_columns(Artist.id, Artist.name, Artist.image_link, Show.start_time) \
-            .filter(Show.venue_id == venue_id).all()
+            .filter(Show.venue_id == venue_id)
+        return Show.filter_by_start_time(statement, upcoming, limit)
+
+    @classmethod
+    def get_show_by_artist_id(cls, artist_id, upcoming=True, limit=None):
+        return db.session.execute(Show.select_show_by_artist_id(artist_id, upcoming, limit)).all()
 
     @classmethod
-    def get_show_by_artist_id(cls, artist_id):
-        return Show.query \
+    def select_show_by_artist_id(cls, artist_id, upcoming=True, limit=None):
+        statement = db.select(Show.id, Venue.id.label('venue_id'), Venue.name.label('venue_name'),
+                              Venue.image_link.label('venue_image_link'), Show.start_time) \
             .join(Venue, Venue.id == Show.venue_id) \
-            .add_columns(Venue.id, Venue.name, Venue.image_link, Show.start_time) \
-            .filter(Show.artist_id == artist_id).all()
+            .filter(Show.artist_id == artist_id)
+        return Show.filter_by_start_time(statement, upcoming, limit)
 
     @classmethod
-    def get_upcomming_shows(cls, shows):
-        return list(filter(lambda show: show.get('start_time') >= datetime.now(), shows))
+    def filter_by_start_time(cls, query, upcoming, limit=None):
+        # upcoming shows soonest first, past shows most recent first
+        if upcoming:
+            query = query.filter(Show.start_time >= datetime.now()).order_by(Show.start_time)
+        else:
+            query = query.filter(Show.start_time < datetime.now()).order_by(Show.start_time.desc())
+        return query.limit(limit) if limit else query
+
+    @classmethod
+    def get_last_modified(cls, column, entity_id):
+        # latest change among the shows of a venue or artist and the rows they display
+        return max(filter(None, db.session.execute(Show.select_last_modified(column, entity_id)).one()),
+                   default=None)
+
+    @classmethod
+    def select_last_modified(cls, column, entity_id):
+        return db.select(db.func.max(Show.updated_at), db.func.max(Venue.updated_at), db.func.max(Artist.updated_at)) \
+            .select_from(Show) \
+            .join(Venue, Show.venue_id == Venue.id) \
+            .join(Artist, Show.artist_id == Artist.id) \
+            .filter(column == entity_id)
 
     @classmethod
-    def get_past_shows(cls, shows):
-        return list(filter(lambda show: show.get('start_time') < datetime.now(), shows))
+    def count_shows(cls, column, entity_id):
+        # (upcoming, past) show counts for one venue or artist
+        return db.session.execute(Show.select_count_shows(column, entity_id)).one()
 
     @classmethod
+    def select_count_shows(cls, column, entity_id):
+        now = datetime.now()
+        return db.select(db.func.count(db.case((Show.start_time >= now, 1))),
+                         db.func.count(db.case((Show.start_time < now, 1)))) \
+            .filter(column == entity_id)
+
+    @classmethod
+    @db.read_only
     def search_show_by_keyword(cls, keyword):
         return Show.get_show_by_artist_or_venue_name(keyword)
 
     @classmethod
+    @db.read_only
     def get_show_by_artist_or_venue_name(cls, keyword):
+        statement = Show.select_show_by_artist_or_venue_name(keyword)
+        return db.session.execute(statement).all() if statement is not None else []
+
+    @classmethod
+    def select_show_by_artist_or_venue_name(cls, keyword):
+        statement = db.select(Show.id, Show.venue_id, Venue.name.label('venue_name'),
+                              Show.artist_id, Artist.name.label('artist_name'),
+                              Artist.image_link.label('artist_image_link'), Show.start_time) \
+            .join(Venue, Show.venue_id == Venue.id) \
+            .join(Artist, Show.artist_id == Artist.id)
         if isinstance(keyword, str):
-            shows = Show.query.join(Venue, Show.venue_id == Venue.id) \
-                .join(Artist, Show.artist_id == Artist.id) \
-                .filter((Venue.name.ilike('%' + keyword + '%') | Artist.name.ilike('%' + keyword + '%') | (Show.start_time == keyword)))\
-                .all()
-        elif isinstance(keyword, datetime):
-            shows = Show.query.join(Venue, Show.venue_id == Venue.id) \
-                .join(Artist, Show.artist_id == Artist.id) \
-                .filter(Show.start_time == keyword) \
-                .all()
-        else:
-            shows = []
-        return shows
+            # one lookup per name index, an OR across the joined tables could use neither
+            pattern = '%' + keyword + '%'
+            ids = [db.select(Show.id).join(Venue, Show.venue_id == Venue.id).filter(Venue.name.ilike(pattern)),
+                   db.select(Show.id).join(Artist, Show.artist_id == Artist.id).filter(Artist.name.ilike(pattern))]
+            start_time = parse_start_time(keyword)
+            if start_time is not None:
+                ids.append(db.select(Show.id).filter(Show.start_time == start_time))
+            statement = statement.filter(Show.id.in_(db.union(*ids)))
+            return rank_by_name(statement, keyword, Venue.name, Artist.name)
+        if isinstance(keyword, datetime):
+            return statement.filter(Show.start_time == keyword)
+        return None
@@ -0,0 +1,94 @@
+import functools
+import random
+import time
+
+from flask import g, has_request_context, request
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import event, orm
+
+'''
+    Read replica routing. Model methods marked with @db.read_only run their
+    queries on one of the replicas (DATABASE_REPLICA_URLS), everything else
+    uses the primary. After a request that writes, the client reads from the
+    primary for REPLICA_STICKY_SECONDS so it sees its own writes despite
+    replication lag, and a session that has flushed stays on the primary.
+'''
+
+STICKY_COOKIE = 'read_primary_until'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def replica_keys(app):
+    return sorted(key for key in app.config.get('SQLALCHEMY_BINDS') or {} if key.startswith('replica'))
+
+
+class RoutingSession(SignallingSession):
+
+    def __init__(self, db, *args, **kwargs):
+        super().__init__(db, *args, **kwargs)
+        self.db = db
+        self.replicas = replica_keys(self.app)
+
+    def use_replica(self):
+        if not self.replicas or not self.info.get('read_only') or self.info.get('wrote') or self._flushing:
+            return False
+        return not (has_request_context() and g.get('read_primary'))
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.use_replica():
+            # one replica per session, so the reads of a request see one consistent copy
+            key = self.info.setdefault('replica', random.choice(self.replicas))
+            return self.db.get_engine(self.app, bind=key)
+        return super().get_bind(mapper, clause)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def after_flush(session, flush_context):
+    session.info['wrote'] = True
+    if has_request_context():
+        g.read_primary = True
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def read_only(self, method):
+        # the queries run by method may go to a replica
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            info = self.session.info
+            previous = info.get('read_only', False)
+            info['read_only'] = True
+            try:
+                return method(*args, **kwargs)
+            finally:
+                info['read_only'] = previous
+        return wrapper
+
+
+def sticky_until(value):
+    try:
+        return float(value or 0)
+    except ValueError:
+        return 0
+
+
+def setup_replicas(app):
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    for index, url in enumerate(app.config['DATABASE_REPLICA_URLS']):
+        binds['replica_{}'.format(index)] = url
+    app.config['SQLALCHEMY_BINDS'] = binds
+
+    @app.before_request
+    def read_primary_after_write():
+        g.read_primary = sticky_until(request.cookies.get(STICKY_COOKIE)) > time.time()
+
+    @app.after_request
+    def stick_to_primary(response):
+        if request.method not in SAFE_METHODS and app.config['DATABASE_REPLICA_URLS']:
+            sticky = app.config['REPLICA_STICKY_SECONDS']
+            response.set_cookie(STICKY_COOKIE, str(int(time.time() + sticky)), max_age=sticky, httponly=True,
+                                samesite='Lax')
+        return response
@@ -0,0 +1,66 @@
+import os
+import secrets
+import tempfile
+from flask.sessions import SecureCookieSessionInterface
+from itsdangerous import URLSafeTimedSerializer
+
+'''
+    Signed cookie sessions that every worker can read.
+    The key comes from SECRET_KEY, or from SECRET_KEY_FILE which is created
+    on first start and then shared by all workers on the host. Previous keys
+    stay valid for reading while cookies signed with them expire.
+'''
+
+
+def read_keys(path):
+    # first line is the signing key, the following lines are previous keys
+    with open(path) as file:
+        return [line.strip() for line in file if line.strip()]
+
+
+def create_key_file(path):
+    # write to a temporary file and hard link it into place, the link fails if
+    # another worker got there first so every process ends up with the same key
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory)
+    try:
+        with os.fdopen(fd, 'w') as file:
+            file.write(secrets.token_hex(32) + '\n')
+        os.link(tmp, path)
+    except FileExistsError:
+        pass
+    finally:
+        os.unlink(tmp)
+
+
+def load_secret_keys(config):
+    if config.get('SECRET_KEY'):
+        return [config['SECRET_KEY']] + list(config.get('SECRET_KEY_FALLBACKS') or [])
+    path = config['SECRET_KEY_FILE']
+    if not os.path.exists(path):
+        create_key_file(path)
+    keys = read_keys(path)
+    if not keys:
+        raise RuntimeError('{} does not contain a secret key'.format(path))
+    return keys
+
+
+class RotatingSessionInterface(SecureCookieSessionInterface):
+    # signs with the current key and accepts cookies signed with any fallback key
+
+    def get_signing_serializer(self, app):
+        keys = app.config['SECRET_KEYS']
+        if not keys:
+            return None
+        # itsdangerous signs with the last key and tries all of them when loading
+        return URLSafeTimedSerializer(list(reversed(keys)), salt=self.salt, serializer=self.serializer,
+                                      signer_kwargs={'key_derivation': self.key_derivation,
+                                                     'digest_method': self.digest_method})
+
+
+def setup_sessions(app):
+    keys = load_secret_keys(app.config)
+    app.config['SECRET_KEYS'] = keys
+    app.secret_key = keys[0]
+    app.session_interface = RotatingSessionInterface()
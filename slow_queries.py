@@ -0,0 +1,153 @@
+import glob
+import hashlib
+import json
+import random
+import re
+import time
+from collections import defaultdict
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+'''
+    Slow query detection. Statements slower than SLOW_QUERY_MS are logged
+    on app.slow_query with their parameters and a fingerprint, and on
+    postgres the plan of a sample of them (SLOW_QUERY_EXPLAIN_RATE) is
+    captured with a plain EXPLAIN. The records go through
+    the regular log pipeline, `flask slow-queries` summarizes them.
+'''
+
+MAX_PARAMETERS_LENGTH = 2000
+
+PLACEHOLDER = r'(?:%\(\w+\)s|%s|\?|:\w+|\$\d+)'
+PLACEHOLDER_LIST = re.compile(r'\(\s*{0}(?:\s*,\s*{0})*\s*\)'.format(PLACEHOLDER))
+LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+def fingerprint(statement):
+    # same query shape, same fingerprint: literals, placeholders and IN lists are folded
+    normalized = LITERAL.sub('?', statement)
+    normalized = PLACEHOLDER_LIST.sub('(?)', normalized)
+    normalized = re.sub(PLACEHOLDER, '?', normalized)
+    normalized = ' '.join(normalized.split())
+    return hashlib.sha1(normalized.encode()).hexdigest()[:12]
+
+
+def format_parameters(parameters, executemany):
+    if executemany:
+        parameters = {'rows': len(parameters), 'first': parameters[0] if parameters else None}
+    text = json.dumps(parameters, default=str)
+    return text if len(text) <= MAX_PARAMETERS_LENGTH else text[:MAX_PARAMETERS_LENGTH] + '...'
+
+
+def explain(cursor, statement, parameters):
+    # without ANALYZE the statement is only planned, not run a second time by a request that is already
+    # slow; inside a savepoint so that a failing EXPLAIN does not abort the request's transaction
+    connection = cursor.connection
+    explain_cursor = connection.cursor()
+    try:
+        explain_cursor.execute('SAVEPOINT explain_slow_query')
+        try:
+            explain_cursor.execute('EXPLAIN (FORMAT JSON) ' + statement, parameters)
+            plan = explain_cursor.fetchone()[0]
+        except Exception as error:
+            explain_cursor.execute('ROLLBACK TO SAVEPOINT explain_slow_query')
+            return {'error': str(error)}
+        explain_cursor.execute('RELEASE SAVEPOINT explain_slow_query')
+        return plan
+    finally:
+        explain_cursor.close()
+
+
+class SlowQueryDetector:
+
+    def __init__(self, logger, threshold, explain_rate):
+        self.logger = logger
+        self.threshold = threshold / 1000
+        self.explain_rate = explain_rate
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        # as in instrumentation, a single value that the next statement replaces if this one raises
+        conn.info['slow_query_start'] = time.perf_counter()
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info.pop('slow_query_start')
+        if elapsed < self.threshold:
+            return
+        data = {
+            'duration_ms': round(elapsed * 1000, 2),
+            'fingerprint': fingerprint(statement),
+            'statement': statement,
+            'parameters': format_parameters(parameters, executemany),
+        }
+        if self.should_explain(conn, statement, executemany):
+            data['plan'] = explain(cursor, statement, parameters)
+        self.logger.warning('slow query %s took %.0f ms', data['fingerprint'], elapsed * 1000, extra=data)
+
+    def should_explain(self, conn, statement, executemany):
+        return (self.explain_rate and not executemany and conn.dialect.name == 'postgresql'
+                and statement.lstrip().upper().startswith(('SELECT', 'WITH'))
+                and random.random() < self.explain_rate)
+
+
+def setup_slow_queries(app):
+    if not app.config['SLOW_QUERY_MS']:
+        return
+    detector = SlowQueryDetector(app.logger.getChild('slow_query'), app.config['SLOW_QUERY_MS'],
+                                 app.config['SLOW_QUERY_EXPLAIN_RATE'])
+    event.listen(Engine, 'before_cursor_execute', detector.before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', detector.after_cursor_execute)
+
+
+def read_slow_queries(paths):
+    for path in paths:
+        with open(path) as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry.get('logger', '').endswith('.slow_query') and 'fingerprint' in entry:
+                    yield entry
+
+
+def default_log_files():
+    # the current files and their rotated backups, for every worker
+    pattern = current_app.config['LOG_FILE'].format(pid='*')
+    return sorted(set(glob.glob(pattern) + glob.glob(pattern + '.*')))
+
+
+@click.command('slow-queries')
+@click.argument('paths', nargs=-1, type=click.Path(exists=True, dir_okay=False))
+@click.option('--top', default=10, show_default=True, help='Number of fingerprints to list.')
+@click.option('--sort', type=click.Choice(['total', 'max', 'count']), default='total', show_default=True)
+@click.option('--show', 'show_fingerprint', help='Print the statement and the last captured plan of a fingerprint.')
+@with_appcontext
+def slow_queries(paths, top, sort, show_fingerprint):
+    '''Summarize the slow queries found in the log files.'''
+    stats = defaultdict(lambda: {'count': 0, 'total': 0.0, 'max': 0.0, 'statement': None, 'plan': None})
+    for entry in read_slow_queries(paths or default_log_files()):
+        item = stats[entry['fingerprint']]
+        item['count'] += 1
+        item['total'] += entry['duration_ms']
+        item['max'] = max(item['max'], entry['duration_ms'])
+        item['statement'] = entry['statement']
+        if entry.get('plan'):
+            item['plan'] = entry['plan']
+
+    if show_fingerprint:
+        if show_fingerprint not in stats:
+            raise click.ClickException('no slow query with fingerprint {}'.format(show_fingerprint))
+        item = stats[show_fingerprint]
+        click.echo(item['statement'])
+        click.echo(json.dumps(item['plan'], indent=2) if item['plan'] else 'no plan captured')
+        return
+
+    click.echo('{:<12} {:>7} {:>11} {:>9} {:>9}  statement'.format('fingerprint', 'count', 'total ms', 'mean ms', 'max ms'))
+    for key, item in sorted(stats.items(), key=lambda pair: pair[1][sort], reverse=True)[:top]:
+        click.echo('{:<12} {:>7} {:>11.1f} {:>9.1f} {:>9.1f}  {}'.format(
+            key, item['count'], item['total'], item['total'] / item['count'], item['max'],
+            ' '.join(item['statement'].split())[:80]))
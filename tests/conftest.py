@@ -0,0 +1,49 @@
+import os
+
+# configure the app for an in-memory database before it is imported
+os.environ['DATABASE_URL'] = 'sqlite://'
+os.environ['SECRET_KEY'] = 'test'
+os.environ['LOG_FILE'] = os.devnull
+os.environ['CACHE_TYPE'] = 'null'
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app import app as flask_app
+from models import db
+from cache import fragments, setup_cache
+
+
+@pytest.fixture
+def app():
+    flask_app.config['WTF_CSRF_ENABLED'] = False
+    setup_cache(flask_app)
+    with flask_app.app_context():
+        db.create_all()
+        yield flask_app
+        db.session.remove()
+        db.drop_all()
+    fragments.clear()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client(use_cookies=False)
+
+
+class StatementCounter:
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+
+@pytest.fixture
+def statements():
+    counter = StatementCounter()
+    event.listen(Engine, 'after_cursor_execute', counter)
+    yield counter
+    event.remove(Engine, 'after_cursor_execute', counter)
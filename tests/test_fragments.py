@@ -0,0 +1,14 @@
+import pytest
+
+from cache import FragmentCache
+
+
+@pytest.mark.parametrize('first, second', [
+    (['venue', 1, 'Bar:The Club'], ['venue', '1:Bar', 'The Club']),
+    (['artist', 2, None], ['artist', 2, 'None']),
+])
+def test_parts_joining_alike_get_their_own_fragments(first, second):
+    fragments = FragmentCache()
+    assert fragments.get_or_render('tile', first, lambda: 'first') == 'first'
+    assert fragments.get_or_render('tile', second, lambda: 'second') == 'second'
+    assert fragments.get_or_render('tile', first, lambda: 'again') == 'first'
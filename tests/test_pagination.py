@@ -0,0 +1,48 @@
+import base64
+import json
+
+import pytest
+
+from models import db, Venue, Show, decode_cursor, paginate
+
+
+def cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+@pytest.mark.parametrize('values', [['a'], [True], [None], {'id': 1}, [1, 2]])
+def test_forged_cursor_is_ignored(app, values):
+    assert decode_cursor(cursor(values), [Venue.id]) is None
+
+
+def test_cursor_values_are_decoded(app):
+    assert decode_cursor(cursor(['2030-01-01T20:00:00', 5]), [Show.start_time, Show.id])[1] == 5
+
+
+@pytest.mark.parametrize('url, values', [
+    ('/venues', ['TX', 'Austin', 'a']),
+    ('/artists', ['a']),
+    ('/shows', ['2030-01-01T20:00:00', 'a']),
+    ('/api/v1/venues', ['TX', 'Austin', 'a']),
+    ('/api/v1/shows', ['2030-01-01T20:00:00', 'a']),
+])
+def test_listing_with_forged_cursor(client, url, values):
+    assert client.get(url, query_string={'after': cursor(values)}).status_code == 200
+
+
+def test_pages_walk_over_null_sort_values(app):
+    db.session.add_all([Venue(name='Venue {}'.format(index), city=city, state=state, address='1 Main St')
+                        for index, (state, city) in enumerate([('TX', 'Austin'), (None, None), ('CA', None),
+                                                               (None, 'Reno'), ('TX', 'Austin'), (None, None)])])
+    db.session.commit()
+    columns = [Venue.state, Venue.city, Venue.id]
+
+    pages = [paginate(Venue.query, columns, limit=2)]
+    # a cursor the listing cannot follow would start over from page one
+    while pages[-1].next_cursor and len(pages) < 4:
+        pages.append(paginate(Venue.query, columns, after=pages[-1].next_cursor, limit=2))
+    ids = [venue.id for page in pages for venue in page.items]
+    assert sorted(ids) == [venue.id for venue in Venue.query.order_by(Venue.id)]
+
+    previous = paginate(Venue.query, columns, before=pages[-1].prev_cursor, limit=2)
+    assert [venue.id for venue in previous.items] == [venue.id for venue in pages[-2].items]
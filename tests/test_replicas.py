@@ -0,0 +1,57 @@
+import time
+
+import pytest
+from sqlalchemy import orm
+
+from models import db, Venue
+from routing import STICKY_COOKIE
+
+VENUE = {'name': 'New Venue', 'city': 'Austin', 'state': 'TX', 'address': '1 Main St', 'phone': '555-555-5555',
+         'genres': ['Jazz'], 'seeking_talent': 'y', 'seeking_description': 'Looking for bands'}
+
+
+def add_venue(session, name):
+    session.add(Venue(name=name, city='Austin', state='TX', address='1 Main St'))
+    session.commit()
+
+
+@pytest.fixture
+def replica(app):
+    # an in-memory sqlite bind is a database of its own, holding other rows than the primary
+    app.config['SQLALCHEMY_BINDS']['replica_0'] = 'sqlite://'
+    app.config['DATABASE_REPLICA_URLS'] = ['sqlite://']
+    app.config['REPLICA_STICKY_SECONDS'] = 1
+    engine = db.get_engine(app, bind='replica_0')
+    db.Model.metadata.create_all(engine)
+    db.session.remove()
+    yield engine
+    db.session.remove()
+    db.Model.metadata.drop_all(engine)
+    del app.config['SQLALCHEMY_BINDS']['replica_0']
+    app.config['DATABASE_REPLICA_URLS'] = []
+
+
+def test_listing_reads_primary_after_write(app, client, replica):
+    add_venue(db.session, 'Primary Hall')
+    with orm.Session(replica) as session:
+        add_venue(session, 'Replica Hall')
+    # a session that has written stays on the primary, and the requests share the test's app context
+    db.session.remove()
+
+    listing = client.get('/venues').data
+    assert b'Replica Hall' in listing and b'Primary Hall' not in listing
+
+    response = client.post('/venues/create', data=VENUE)
+    db.session.remove()
+    cookie = response.headers['Set-Cookie']
+    assert cookie.startswith(STICKY_COOKIE + '=')
+    until = cookie.split(';')[0].split('=')[1]
+    headers = {'Cookie': '{}={}'.format(STICKY_COOKIE, until)}
+
+    listing = client.get('/venues', headers=headers).data
+    assert b'Primary Hall' in listing and b'New Venue' in listing and b'Replica Hall' not in listing
+
+    # once the cookie has expired the client is back on the replica
+    time.sleep(max(0, float(until) - time.time()) + 0.01)
+    listing = client.get('/venues', headers=headers).data
+    assert b'Replica Hall' in listing and b'New Venue' not in listing
@@ -0,0 +1,34 @@
+from datetime import datetime, timedelta
+
+from models import db, Venue, Artist, Show
+
+
+def add_shows(venue_name, count):
+    venue = Venue(name=venue_name, city='Austin', state='TX', address='1 Main St')
+    artist = Artist(name='{} Band'.format(venue_name), city='Austin', state='TX')
+    db.session.add_all([venue, artist])
+    db.session.flush()
+    start = datetime(2030, 1, 1, 20)
+    db.session.add_all([Show(venue_id=venue.id, artist_id=artist.id, start_time=start + timedelta(days=day))
+                        for day in range(count)])
+    db.session.commit()
+
+
+def search(client, statements, keyword):
+    client.post('/shows/search', data={'search_term': keyword})
+    statements.count = 0
+    response = client.post('/shows/search', data={'search_term': keyword})
+    assert response.status_code == 200
+    return response, statements.count
+
+
+def test_round_trips_do_not_depend_on_matches(app, client, statements):
+    add_shows('Alpha Hall', 1)
+    add_shows('Beta Room', 25)
+
+    one, one_count = search(client, statements, 'Alpha')
+    many, many_count = search(client, statements, 'Beta')
+
+    assert one.data.count(b'Alpha Hall') >= 1
+    assert many.data.count(b'Beta Room') >= 25
+    assert one_count == many_count
@@ -0,0 +1,46 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# a worker: prints a session cookie it signed, then reads cookies from the
+# other workers and prints the session each one decodes to
+WORKER = '''
+import os, sys
+from app import app
+serializer = app.session_interface.get_signing_serializer(app)
+print(serializer.dumps({'worker': os.getpid()}), flush=True)
+for line in sys.stdin:
+    print(serializer.loads(line.strip())['worker'], flush=True)
+'''
+
+
+def start_worker(key_file):
+    env = dict(os.environ, SECRET_KEY_FILE=str(key_file))
+    env.pop('SECRET_KEY', None)
+    return subprocess.Popen([sys.executable, '-c', WORKER], cwd=ROOT, env=env, text=True,
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+
+def exchange(worker, cookies):
+    # the workers' pids, as decoded from their cookies by this worker
+    output, _ = worker.communicate(''.join(cookie + '\n' for cookie in cookies), timeout=60)
+    assert worker.returncode == 0
+    return [int(line) for line in output.split()]
+
+
+def test_workers_accept_each_others_cookies(tmp_path):
+    key_file = tmp_path / 'secret_key'
+    # both start without a key file, they have to agree on the one that gets created
+    first, second = start_worker(key_file), start_worker(key_file)
+    first_cookie, second_cookie = first.stdout.readline().strip(), second.stdout.readline().strip()
+    assert exchange(first, [second_cookie]) == [second.pid]
+    assert exchange(second, [first_cookie]) == [first.pid]
+
+    # rotate: the new key signs, the previous one is kept on the next line
+    key_file.write_text('rotated\n' + key_file.read_text())
+    rotated = start_worker(key_file)
+    rotated_cookie = rotated.stdout.readline().strip()
+    assert rotated_cookie != first_cookie
+    assert exchange(rotated, [first_cookie, second_cookie]) == [first.pid, second.pid]
@@ -0,0 +1,22 @@
+from datetime import datetime, timedelta
+
+from models import db, Venue, Artist, Show
+
+
+def test_delete_show_started_since_refresh(app):
+    venue = Venue(name='Gamma Club', city='Austin', state='TX', address='1 Main St')
+    artist = Artist(name='Gamma Band', city='Austin', state='TX')
+    db.session.add_all([venue, artist])
+    db.session.commit()
+    show = Show(venue_id=venue.id, artist_id=artist.id, start_time=datetime.now() + timedelta(hours=1))
+    show.insert()
+    assert (venue.upcoming_shows_count, venue.past_shows_count) == (1, 0)
+
+    # the show starts, the counters still count it as upcoming until the next refresh
+    show.start_time = datetime.now() - timedelta(minutes=1)
+    db.session.commit()
+    show.delete()
+
+    for entity in (venue, artist):
+        db.session.refresh(entity)
+        assert (entity.upcoming_shows_count, entity.past_shows_count, entity.next_show_at) == (0, 0, None)